@@ -1,13 +1,16 @@
+import functools
+import logging
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 import pandas as pd
-from date_parsing import parse_date
+from date_parsing import parse_date, add_years
 from constants import (
-    SCODS, TIG, TIG_MONTHS_REQUIRED, TAFMSD, MDOS,
-    MAIN_HIGHER_TENURE, EXCEPTION_HIGHER_TENURE, PAFSC_MAP,
-    RE_CODES, hyt_start_date, hyt_end_date
+    SCODS_PARSED, GRADE_PROFILE, PAFSC_MAP,
+    RE_CODES, RE_DISQUALIFYING, hyt_start_ord, hyt_end_ord
 )
 
+logger = logging.getLogger(__name__)
+
 
 def pafsc_check(grade, pafsc, two_afsc, three_afsc, four_afsc):
     if pafsc and pafsc[0] in ('8', '9'):
@@ -23,11 +26,8 @@ def pafsc_check(grade, pafsc, two_afsc, three_afsc, four_afsc):
         if isinstance(afsc, str) and len(afsc) >= 5:
             skill_level_index = 4 if afsc[0].isalpha() or afsc[0] == '-' else 3
 
-            try:
-                if afsc[skill_level_index] >= required_level:
-                    return True
-            except IndexError:
-                continue
+            if afsc[skill_level_index] >= required_level:
+                return True
 
     return False
 
@@ -36,9 +36,10 @@ def btz_elgibility_check(date_of_rank, year):
     date_of_rank = parse_date(date_of_rank)
     if not date_of_rank:
         return False
-    cutoff_date = datetime.strptime(f"01-Feb-{year}", "%d-%b-%Y")
+    cutoff_date = datetime(year, 2, 1)
     btz_date_of_rank = date_of_rank + relativedelta(months=22)
-    scod_date = datetime.strptime(f"{SCODS.get('SRA')}-{year}", "%d-%b-%Y")
+    scod_day, scod_month = SCODS_PARSED['SRA']
+    scod_date = datetime(year, scod_month, scod_day)
     if btz_date_of_rank <= cutoff_date:
         return True
     if cutoff_date < btz_date_of_rank <= scod_date:
@@ -50,8 +51,9 @@ def check_a1c_eligbility(date_of_rank, year):
     date_of_rank = parse_date(date_of_rank)
     if not date_of_rank:
         return False
-    cutoff_date = datetime.strptime(f"01-Feb-{year}", "%d-%b-%Y")
-    scod_date = datetime.strptime(f"{SCODS.get('SRA')}-{year}", "%d-%b-%Y")
+    cutoff_date = datetime(year, 2, 1)
+    scod_day, scod_month = SCODS_PARSED['SRA']
+    scod_date = datetime(year, scod_month, scod_day)
     standard_a1c_date_of_rank = date_of_rank + relativedelta(months=28)
     if standard_a1c_date_of_rank <= cutoff_date:
         return True
@@ -69,6 +71,30 @@ def three_year_tafmsd_check(scod_as_datetime, tafmsd):
     return adjusted_tafmsd <= scod_as_datetime
 
 
+@functools.lru_cache(maxsize=64)
+def board_cutoff_dates(grade, year):
+    """Return the (SCOD, TIG cutoff, TIS cutoff, MDOS) dates shared by every member of a grade's board."""
+    profile = GRADE_PROFILE[grade]
+    scod_day, scod_month = profile.scod_day_month
+    scod_as_datetime = datetime(year, scod_month, scod_day)
+    tig_day, tig_month = profile.tig_day_month
+    formatted_tig_selection_month = datetime(year + 1, tig_month, tig_day)
+    tig_eligibility_month = formatted_tig_selection_month - relativedelta(months=profile.tig_months_required)
+    tafmsd_years = profile.tafmsd_years
+    if tafmsd_years < 1:
+        months_total = int(tafmsd_years * 12)
+        tafmsd_required_date = formatted_tig_selection_month - relativedelta(months=months_total)
+    else:
+        months_component = int((tafmsd_years % 1) * 12)
+        years_component = int(tafmsd_years)
+        tafmsd_required_date = formatted_tig_selection_month - relativedelta(years=years_component,
+                                                                             months=months_component)
+    mdos_day, mdos_month = profile.mdos_day_month
+    mdos = datetime(year + 1, mdos_month, mdos_day)
+    return scod_as_datetime, tig_eligibility_month, tafmsd_required_date, mdos
+
+
+@functools.lru_cache(maxsize=4096)
 def board_filter(grade, year, date_of_rank, uif_code, uif_disposition_date, tafmsd, re_status, pafsc, two_afsc,
                  three_afsc, four_afsc):
     try:
@@ -81,30 +107,9 @@ def board_filter(grade, year, date_of_rank, uif_code, uif_disposition_date, tafm
         if date_of_rank is None or tafmsd is None:
             return False, 'Required date missing or unreadable'
 
-        scod = f'{SCODS.get(grade)}-{year}'
-        scod_as_datetime = datetime.strptime(scod, "%d-%b-%Y")
-        tig_selection_month = f'{TIG.get(grade)}-{year + 1}'
-        formatted_tig_selection_month = datetime.strptime(tig_selection_month, "%d-%b-%Y")
-        tig_eligibility_month = formatted_tig_selection_month - relativedelta(months=TIG_MONTHS_REQUIRED.get(grade))
-        tafmsd_years = TAFMSD.get(grade)
-        if tafmsd_years < 1:
-            months_total = int(tafmsd_years * 12)
-            tafmsd_required_date = formatted_tig_selection_month - relativedelta(months=months_total)
-        else:
-            months_component = int((tafmsd_years % 1) * 12)
-            years_component = int(tafmsd_years)
-            tafmsd_required_date = formatted_tig_selection_month - relativedelta(years=years_component,
-                                                                                 months=months_component)
-        hyt_years = MAIN_HIGHER_TENURE.get(grade)
-        if hyt_years < 1:
-            hyt_months_total = int(hyt_years * 12)
-            hyt_date = tafmsd + relativedelta(months=hyt_months_total)
-        else:
-            hyt_months_component = int((hyt_years % 1) * 12)
-            hyt_years_component = int(hyt_years)
-            hyt_date = tafmsd + relativedelta(years=hyt_years_component, months=hyt_months_component)
-        mdos_month = f'{MDOS.get(grade)}-{year + 1}'
-        mdos = datetime.strptime(mdos_month, "%d-%b-%Y")
+        profile = GRADE_PROFILE[grade]
+        scod_as_datetime, tig_eligibility_month, tafmsd_required_date, mdos = board_cutoff_dates(grade, year)
+        hyt_date = add_years(tafmsd, profile.main_hyt_years)
         btz_check = None
 
         if grade == 'A1C':
@@ -119,12 +124,11 @@ def board_filter(grade, year, date_of_rank, uif_code, uif_disposition_date, tafm
             if three_year_tafmsd_check(scod_as_datetime, tafmsd):
                 return False, 'SRA 2 Feb - 31 Mar or 3yr TIS'
         if date_of_rank is None or date_of_rank > tig_eligibility_month:
-            return False, f'TIG: < {TIG_MONTHS_REQUIRED.get(grade)} months'
+            return False, f'TIG: < {profile.tig_months_required} months'
         if tafmsd > tafmsd_required_date:
-            return False, f'TIS < {TAFMSD.get(grade)} years'
-        if hyt_start_date < hyt_date < hyt_end_date:
-            exception_hyt_years = EXCEPTION_HIGHER_TENURE.get(grade, MAIN_HIGHER_TENURE.get(grade))
-            hyt_date = tafmsd + relativedelta(years=exception_hyt_years)
+            return False, f'TIS < {profile.tafmsd_years} years'
+        if hyt_start_ord < hyt_date.toordinal() < hyt_end_ord:
+            hyt_date = add_years(tafmsd, profile.exception_hyt_years)
         if hyt_date < mdos:
             return False, 'Higher tenure.'
         try:
@@ -134,8 +138,8 @@ def board_filter(grade, year, date_of_rank, uif_code, uif_disposition_date, tafm
         # Allow uif_disposition_date to be None since it's optional
         if uif_code > 1 and uif_disposition_date and uif_disposition_date < scod_as_datetime:
             return False, f'UIF code: {uif_code}'
-        if re_status in RE_CODES.keys():
-            return False, f'{re_status}: {RE_CODES.get(re_status)}'
+        if re_status in RE_DISQUALIFYING:
+            return False, f'{re_status}: {RE_CODES[re_status]}'
         if grade not in ('SMS', 'MSG'):
             if pafsc_check(grade, pafsc, two_afsc, three_afsc, four_afsc) is False:
                 return False, 'Insufficient PAFSC skill level.'
@@ -143,5 +147,5 @@ def board_filter(grade, year, date_of_rank, uif_code, uif_disposition_date, tafm
             return True, 'btz'
         return True
     except Exception as e:
-        print(f"error reading file: {e}")
+        logger.exception("Error evaluating board eligibility")
         return False, f'Processing error: {str(e)}'
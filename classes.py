@@ -1,4 +1,5 @@
-from typing import Dict
+from datetime import datetime
+from typing import Any, Dict, NamedTuple, Optional
 from pydantic import BaseModel
 
 class PasCodeInfo(BaseModel):
@@ -9,4 +10,23 @@ class PasCodeInfo(BaseModel):
 
 class PasCodeSubmission(BaseModel):
     session_id: str
-    pascode_info: Dict[str, PasCodeInfo]
\ No newline at end of file
+    pascode_info: Dict[str, PasCodeInfo]
+
+class RosterMember(NamedTuple):
+    """One roster row, with fields in REQUIRED_COLUMNS + OPTIONAL_COLUMNS order."""
+    full_name: str
+    grade: str
+    assigned_pas_cleartext: str
+    dafsc: str
+    dor: Optional[datetime]
+    date_arrived_station: Optional[datetime]
+    tafmsd: Optional[datetime]
+    reenl_elig_status: Any
+    assigned_pas: str
+    pafsc: Any
+    grade_perm_proj: Any
+    uif_code: Any
+    uif_disposition_date: Optional[datetime]
+    two_afsc: Any
+    three_afsc: Any
+    four_afsc: Any
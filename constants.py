@@ -1,10 +1,20 @@
-import os
+import sys
+import logging
+import pathlib
+import threading
 from datetime import datetime
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from types import MappingProxyType
+from typing import TYPE_CHECKING, NamedTuple
 from reportlab.lib.pagesizes import landscape, letter
 from reportlab.lib.units import inch
-from reportlab.lib import colors
+
+if TYPE_CHECKING:
+    from reportlab.lib.colors import Color
+
+    pdf_fonts: tuple[str, str]
+    PDF_HEADER_COLOR: Color
+
+logger = logging.getLogger(__name__)
 
 # ============================================================================
 # FASTAPI SETTINGS
@@ -19,16 +29,14 @@ cors_origins = [
     "https://www.pace-af-tool.com",
 ]
 
-allowed_types = [
-    "text/csv",
-    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-]
-
 # ============================================================================
 # SESSION SETTINGS
 # ============================================================================
 
 session_ttl = 1800
+redis_max_connections = 32
+redis_pool_timeout = 10  # seconds to wait for a free pooled connection
+pdf_compression_level = 3  # zstd level for PDFs stored in Redis
 
 # ============================================================================
 # PATH SETTINGS
@@ -39,8 +47,10 @@ images_dir = 'images'
 default_logo = 'fiftyonefss.jpeg'
 afpc_logo = 'afpc.png'
 
-font_path = os.path.join(os.path.dirname(__file__), 'fonts', 'calibri.ttf')
-font_bold_path = os.path.join(os.path.dirname(__file__), 'fonts', 'calibrib.ttf')
+# Font files (resolved against this module's directory when fonts are registered)
+fonts_dir = 'fonts'
+font_file = 'calibri.ttf'
+font_bold_file = 'calibrib.ttf'
 
 # ============================================================================
 # UTILITY CONSTANTS
@@ -186,19 +196,27 @@ FEATURES = {
 # COLUMN DEFINITIONS
 # ============================================================================
 
-REQUIRED_COLUMNS = [
+REQUIRED_COLUMNS = (
     'FULL_NAME', 'GRADE', 'ASSIGNED_PAS_CLEARTEXT', 'DAFSC', 'DOR',
     'DATE_ARRIVED_STATION', 'TAFMSD', 'REENL_ELIG_STATUS', 'ASSIGNED_PAS', 'PAFSC'
-]
+)
 
-OPTIONAL_COLUMNS = [
+OPTIONAL_COLUMNS = (
     'GRADE_PERM_PROJ', 'UIF_CODE', 'UIF_DISPOSITION_DATE', '2AFSC', '3AFSC', '4AFSC'
-]
+)
 
-PDF_COLUMNS = [
+PDF_COLUMNS = (
     'FULL_NAME', 'GRADE', 'DATE_ARRIVED_STATION', 'DAFSC',
     'ASSIGNED_PAS_CLEARTEXT', 'DOR', 'TAFMSD', 'ASSIGNED_PAS'
-]
+)
+
+# Text columns are read as strings so the reader skips type inference on them;
+# dates and UIF_CODE are left to the parsers in roster_processor and board_filter.
+COLUMN_DTYPES = {
+    'FULL_NAME': str, 'GRADE': str, 'ASSIGNED_PAS_CLEARTEXT': str, 'DAFSC': str,
+    'REENL_ELIG_STATUS': str, 'ASSIGNED_PAS': str, 'PAFSC': str, 'GRADE_PERM_PROJ': str,
+    '2AFSC': str, '3AFSC': str, '4AFSC': str
+}
 
 # ============================================================================
 # GRADE AND PROMOTION MAPPINGS
@@ -242,7 +260,7 @@ PROMOTIONAL_MAP = {
     'SMS': 'CMS'
 }
 
-BOARDS = ['E5', 'E6', 'E7', 'E8', 'E9']
+BOARDS = ('E5', 'E6', 'E7', 'E8', 'E9')
 
 # Officer ranks to be filtered out of enlisted promotion processing
 OFFICER_RANKS = ['2LT', '1LT', 'CPT', 'MAJ', 'LTC', 'COL', 'BG', 'MG', 'LTG', 'GEN']
@@ -372,6 +390,55 @@ PAFSC_MAP = {
     'SMS': '9'
 }
 
+# Intern grade keys so grades interned at CSV ingest match dict keys by identity
+for _mapping in (GRADE_MAP, PROMOTION_MAP, PROMOTIONAL_MAP, SCODS, TIG, TIG_MONTHS_REQUIRED, TAFMSD, MDOS,
+                 MAIN_HIGHER_TENURE, EXCEPTION_HIGHER_TENURE, PAFSC_MAP):
+    _interned = {sys.intern(key): value for key, value in _mapping.items()}
+    _mapping.clear()
+    _mapping.update(_interned)
+del _mapping, _interned
+
+# ============================================================================
+# GRADE PROFILES
+# ============================================================================
+
+_MONTHS = {
+    'JAN': 1, 'FEB': 2, 'MAR': 3, 'APR': 4, 'MAY': 5, 'JUN': 6,
+    'JUL': 7, 'AUG': 8, 'SEP': 9, 'OCT': 10, 'NOV': 11, 'DEC': 12
+}
+
+
+def _day_month(value):
+    """Split a 'DD-MON' chart date such as '01-FEB' into a (day, month) int tuple."""
+    day, month = value.split('-')
+    return int(day), _MONTHS[month]
+
+
+# Chart dates pre-parsed to (day, month) so per-member checks never call strptime
+TIG_PARSED = {grade: _day_month(value) for grade, value in TIG.items()}
+MDOS_PARSED = {grade: _day_month(value) for grade, value in MDOS.items()}
+SCODS_PARSED = {grade: _day_month(value) for grade, value in SCODS.items()}
+
+
+class GradeProfile(NamedTuple):
+    scod_day_month: tuple[int, int]
+    tig_day_month: tuple[int, int]
+    tig_months_required: int
+    tafmsd_years: float
+    mdos_day_month: tuple[int, int]
+    main_hyt_years: int
+    exception_hyt_years: int
+
+
+# One read-only record per grade so eligibility checks do a single lookup per member
+GRADE_PROFILE = MappingProxyType({
+    grade: GradeProfile(
+        SCODS_PARSED[grade], TIG_PARSED[grade], TIG_MONTHS_REQUIRED[grade], TAFMSD[grade],
+        MDOS_PARSED[grade], MAIN_HIGHER_TENURE[grade], EXCEPTION_HIGHER_TENURE[grade]
+    )
+    for grade in MAIN_HIGHER_TENURE
+})
+
 # ============================================================================
 # REENLISTMENT CODES
 # ============================================================================
@@ -395,6 +462,10 @@ RE_CODES = {
     "4M": "Breach of enlistment.",
     "4N": "Convicted, Civil Court."
 }
+RE_CODES = {sys.intern(code): reason for code, reason in RE_CODES.items()}
+
+# Membership set for the eligibility check; RE_CODES is only read to build the reason text
+RE_DISQUALIFYING = frozenset(RE_CODES)
 
 # ============================================================================
 # HYT EXEMPTION DATE RANGES
@@ -403,6 +474,10 @@ RE_CODES = {
 hyt_start_date = datetime(2023, 12, 8)
 hyt_end_date = datetime(2026, 9, 30)
 
+# Day ordinals of the exemption window so per-member checks compare plain ints
+hyt_start_ord = hyt_start_date.toordinal()
+hyt_end_ord = hyt_end_date.toordinal()
+
 # ============================================================================
 # FONT MANAGEMENT
 # ============================================================================
@@ -412,18 +487,34 @@ font_bold = 'Calibri-Bold'
 font_fallback = 'Helvetica'
 font_fallback_bold = 'Helvetica-Bold'
 
-pdf_fonts = (font_fallback, font_fallback_bold)
 
-try:
-    pdfmetrics.registerFont(TTFont(font_regular, font_path))
-    pdfmetrics.registerFont(TTFont(font_bold, font_bold_path))
-    pdf_fonts = (font_regular, font_bold)
-    print("Successfully registered custom fonts for PDF generation.")
-except Exception as e:
-    print(f"Warning: Could not load custom fonts ({e}). Using fallback fonts.")
+_pdf_fonts_lock = threading.Lock()
+
+
+def ensure_pdf_fonts():
+    """Register the custom PDF fonts once per process (thread-safe) and return the (body, bold) font names."""
+    fonts = globals().get('pdf_fonts')
+    if fonts is not None:
+        return fonts
+    with _pdf_fonts_lock:
+        fonts = globals().get('pdf_fonts')
+        if fonts is not None:
+            return fonts
 
-# Get font names from the pre-registered fonts
-BODY_FONT, BOLD_FONT = pdf_fonts
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        font_dir = pathlib.Path(__file__).parent / fonts_dir
+        fonts = (font_fallback, font_fallback_bold)
+        try:
+            pdfmetrics.registerFont(TTFont(font_regular, str(font_dir / font_file)))
+            pdfmetrics.registerFont(TTFont(font_bold, str(font_dir / font_bold_file)))
+            fonts = (font_regular, font_bold)
+            logger.info("Successfully registered custom fonts for PDF generation.")
+        except Exception as e:
+            logger.warning("Could not load custom fonts (%s). Using fallback fonts.", e)
+        globals()['pdf_fonts'] = fonts
+        return fonts
 
 # ============================================================================
 # PDF GENERATION SHARED CONSTANTS
@@ -464,8 +555,7 @@ PDF_FONT_SIZE_SUBHEADER = 10
 PDF_FONT_SIZE_FOOTER = 8
 PDF_FONT_SIZE_FOOTER_BOTTOM = 12
 
-# Colors
-PDF_HEADER_COLOR = colors.Color(23 / 255, 54 / 255, 93 / 255)  # #17365d
+# Colors (PDF_HEADER_COLOR is built lazily by __getattr__ below)
 PDF_CHECKBOX_BORDER_COLOR = (0, 0, 0)
 PDF_CHECKBOX_FILL_COLOR = (1, 1, 1)
 
@@ -506,3 +596,18 @@ PDF_CHECKBOX_START_Y_PERCENT = 0.276  # Percentage of page height
 PDF_CHECKBOX_ROW_HEIGHT_PERCENT = 0.0295  # Percentage of page height
 PDF_CHECKBOX_COL_WIDTH_PERCENT = 0.045  # Percentage of page width
 PDF_CHECKBOX_MAX_ROWS_PER_PAGE = 20
+
+
+# ============================================================================
+# LAZY REPORTLAB ATTRIBUTES
+# ============================================================================
+
+def __getattr__(name):
+    """Resolve reportlab-backed constants on first access so importing this module stays cheap."""
+    if name == 'pdf_fonts':
+        return ensure_pdf_fonts()
+    if name == 'PDF_HEADER_COLOR':
+        from reportlab.lib import colors
+        globals()[name] = colors.Color(23 / 255, 54 / 255, 93 / 255)  # #17365d
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -33,4 +33,12 @@ def parse_date(value, error_log=None, full_name=None):
     if error_log and full_name:
         error_log.append(f"Date parsing failed for {full_name}: '{original_value}' (type: {original_type})")
 
-    return None
\ No newline at end of file
+    return None
+
+
+def add_years(value, years):
+    # Whole-year shift; 29 Feb falls back to 28 Feb in non-leap years like relativedelta does
+    try:
+        return value.replace(year=value.year + years)
+    except ValueError:
+        return value.replace(year=value.year + years, day=28)
\ No newline at end of file
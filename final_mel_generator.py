@@ -1,6 +1,9 @@
 import pandas as pd
 import os
-import shutil
+import logging
+import functools
+from io import BytesIO
+from concurrent.futures.process import BrokenProcessPool
 import fitz # PyMuPDF
 from reportlab.platypus import PageBreak, Table, TableStyle, Frame
 from reportlab.lib import colors
@@ -12,12 +15,14 @@ from constants import (
     ELIGIBLE_HEADER_ROW, INELIGIBLE_HEADER_ROW,
     ELIGIBLE_TABLE_WIDTHS, INELIGIBLE_TABLE_WIDTHS,
     images_dir, default_logo, max_name_length, small_unit_threshold,
-    PDF_MARGIN, PDF_HEADER_COLOR, BODY_FONT, BOLD_FONT,
+    PDF_MARGIN, PDF_HEADER_COLOR, ensure_pdf_fonts,
     PDF_CHECKBOX_SIZE, PDF_CHECKBOX_START_X_PERCENT, PDF_CHECKBOX_START_Y_PERCENT,
     PDF_CHECKBOX_ROW_HEIGHT_PERCENT, PDF_CHECKBOX_COL_WIDTH_PERCENT,
     PDF_CHECKBOX_MAX_ROWS_PER_PAGE, PDF_FONT_SIZE_HEADER, PDF_FONT_SIZE_SUBHEADER
 )
-from pdf_templates import PDF_Template, create_table, merge_pdfs
+from pdf_templates import PDF_Template, create_table, merge_pdfs, group_by_pascode, pascode_rows, records_to_rows
+
+logger = logging.getLogger(__name__)
 
 
 class FinalMELDocument(PDF_Template):
@@ -25,29 +30,17 @@ class FinalMELDocument(PDF_Template):
     def __init__(self, filename, cycle, melYear=None, **kwargs):
         super().__init__(filename, cycle, melYear, **kwargs)
 
-def create_final_mel_table(doc, data, header, table_type=None, count=None):
-    """Create a table for final MEL with empty checkbox columns."""
-    table_width = doc.page_width - (2 * PDF_MARGIN)
-    col_widths = [table_width * x for x in ELIGIBLE_TABLE_WIDTHS]
-    processed_data = []
-    for row in data:
-        new_row = row[:5] + ["", "", "", ""]
-        processed_data.append(new_row)
-    table_data = [header] + processed_data
-    repeat_rows = 1
-    if table_type and count is not None:
-        status_row = [table_type] + [""] * (len(header) - 2) + [f"Total: {count}"]
-        table_data = [status_row] + table_data
-        repeat_rows = 2
-    table = Table(table_data, repeatRows=repeat_rows, colWidths=col_widths)
+@functools.lru_cache(maxsize=8)
+def _final_mel_table_style(repeat_rows, bold_font, body_font):
+    """Build the final MEL eligible TableStyle once per status-row variant."""
     style = [
         ('BACKGROUND', (0, 0), (-1, repeat_rows - 1), PDF_HEADER_COLOR),
         ('TEXTCOLOR', (0, 0), (-1, repeat_rows - 1), colors.white),
-        ('FONTNAME', (0, 0), (-1, repeat_rows - 1), BOLD_FONT),
+        ('FONTNAME', (0, 0), (-1, repeat_rows - 1), bold_font),
         ('FONTSIZE', (0, 0), (-1, repeat_rows - 1), PDF_FONT_SIZE_HEADER),
         ('BOTTOMPADDING', (0, 0), (-1, repeat_rows - 1), 4),
         ('ROWHEIGHT', (0, 0), (-1, -1), 30),
-        ('FONTNAME', (0, repeat_rows), (-1, -1), BODY_FONT),
+        ('FONTNAME', (0, repeat_rows), (-1, -1), body_font),
         ('FONTSIZE', (0, repeat_rows), (-1, -1), PDF_FONT_SIZE_SUBHEADER),
         ('LINEBELOW', (0, 0), (-1, -1), .5, colors.lightgrey),
         ('ALIGN', (0, repeat_rows - 1), (0, -1), 'LEFT'),
@@ -58,33 +51,39 @@ def create_final_mel_table(doc, data, header, table_type=None, count=None):
         ('ALIGN', (5, repeat_rows - 1), (8, -1), 'CENTER'),
         ('VALIGN', (0, repeat_rows), (-1, -1), 'MIDDLE'),
     ]
-    if table_type and count is not None:
+    if repeat_rows == 2:
         style.extend([
             ('SPAN', (0, 0), (7, 0)),
             ('ALIGN', (8, 0), (8, 0), 'RIGHT'),
         ])
-    table.setStyle(TableStyle(style))
-    return table
+    return TableStyle(style)
 
-def create_ineligible_table(doc, data, header, table_type=None, count=None):
-    """Create a table for ineligible members with a reason column."""
+def create_final_mel_table(doc, data, header, table_type=None, count=None):
+    """Create a table for final MEL with empty checkbox columns."""
     table_width = doc.page_width - (2 * PDF_MARGIN)
-    col_widths = [table_width * x for x in INELIGIBLE_TABLE_WIDTHS]
-    table_data = [header] + data
+    col_widths = [table_width * x for x in ELIGIBLE_TABLE_WIDTHS]
+    table_data = []
     repeat_rows = 1
     if table_type and count is not None:
-        status_row = [table_type] + [""] * (len(header) - 2) + [f"Total: {count}"]
-        table_data = [status_row] + table_data
+        table_data.append([table_type] + [""] * (len(header) - 2) + [f"Total: {count}"])
         repeat_rows = 2
+    table_data.append(header)
+    table_data.extend(row[:5] + ["", "", "", ""] for row in data)
     table = Table(table_data, repeatRows=repeat_rows, colWidths=col_widths)
+    table.setStyle(_final_mel_table_style(repeat_rows, doc.bold_font, doc.body_font))
+    return table
+
+@functools.lru_cache(maxsize=8)
+def _ineligible_table_style(repeat_rows, bold_font, body_font):
+    """Build the final MEL ineligible TableStyle once per status-row variant."""
     style = [
         ('BACKGROUND', (0, 0), (-1, repeat_rows - 1), PDF_HEADER_COLOR),
         ('TEXTCOLOR', (0, 0), (-1, repeat_rows - 1), colors.white),
-        ('FONTNAME', (0, 0), (-1, repeat_rows - 1), BOLD_FONT),
+        ('FONTNAME', (0, 0), (-1, repeat_rows - 1), bold_font),
         ('FONTSIZE', (0, 0), (-1, repeat_rows - 1), PDF_FONT_SIZE_HEADER),
         ('BOTTOMPADDING', (0, 0), (-1, repeat_rows - 1), 4),
         ('ROWHEIGHT', (0, 0), (-1, -1), 30),
-        ('FONTNAME', (0, repeat_rows), (-1, -1), BODY_FONT),
+        ('FONTNAME', (0, repeat_rows), (-1, -1), body_font),
         ('FONTSIZE', (0, repeat_rows), (-1, -1), PDF_FONT_SIZE_SUBHEADER),
         ('LINEBELOW', (0, 0), (-1, -1), .5, colors.lightgrey),
         ('ALIGN', (0, repeat_rows - 1), (0, -1), 'LEFT'),
@@ -94,18 +93,32 @@ def create_ineligible_table(doc, data, header, table_type=None, count=None):
         ('ALIGN', (4, repeat_rows - 1), (4, -1), 'CENTER'),
         ('ALIGN', (5, repeat_rows - 1), (5, -1), 'LEFT'),
     ]
-    if table_type and count is not None:
+    if repeat_rows == 2:
         style.extend([
             ('SPAN', (0, 0), (4, 0)),
             ('ALIGN', (5, 0), (5, 0), 'RIGHT'),
         ])
-    table.setStyle(TableStyle(style))
+    return TableStyle(style)
+
+def create_ineligible_table(doc, data, header, table_type=None, count=None):
+    """Create a table for ineligible members with a reason column."""
+    table_width = doc.page_width - (2 * PDF_MARGIN)
+    col_widths = [table_width * x for x in INELIGIBLE_TABLE_WIDTHS]
+    table_data = []
+    repeat_rows = 1
+    if table_type and count is not None:
+        table_data.append([table_type] + [""] * (len(header) - 2) + [f"Total: {count}"])
+        repeat_rows = 2
+    table_data.append(header)
+    table_data.extend(data)
+    table = Table(table_data, repeatRows=repeat_rows, colWidths=col_widths)
+    table.setStyle(_ineligible_table_style(repeat_rows, doc.bold_font, doc.body_font))
     return table
 
-def add_interactive_checkboxes(pdf_path, eligible_data, pascode):
-    """Add interactive checkboxes using PyMuPDF with precise positioning."""
+def add_interactive_checkboxes(pdf_buffer, eligible_data, pascode):
+    """Add interactive checkboxes using PyMuPDF with precise positioning, rewriting the in-memory PDF."""
     try:
-        doc = fitz.open(pdf_path)
+        doc = fitz.open(stream=pdf_buffer.getvalue(), filetype="pdf")
         current_page_index = 0
         rows_on_current_page = 0
         page_width = doc[0].rect.width
@@ -139,18 +152,18 @@ def add_interactive_checkboxes(pdf_path, eligible_data, pascode):
                 widget.fill_color = (1, 1, 1)
                 page.add_widget(widget)
             rows_on_current_page += 1
-        temp_dir = os.path.dirname(pdf_path)
-        temp_filename = os.path.join(temp_dir, f"temp_{os.path.basename(pdf_path)}")
-        doc.save(temp_filename, garbage=4, deflate=True, clean=True)
+        pdf_bytes = doc.tobytes(garbage=4, deflate=True, clean=True)
         doc.close()
-        shutil.move(temp_filename, pdf_path)
-        return pdf_path
+        pdf_buffer.seek(0)
+        pdf_buffer.truncate()
+        pdf_buffer.write(pdf_bytes)
+        return pdf_buffer
     except Exception as e:
         try:
             doc.close()
         except:
             pass
-        return pdf_path
+        return pdf_buffer
 
 def generate_final_mel_pdf(eligible_data, ineligible_data, senior_rater, senior_raters, cycle, melYear, pascode, pas_info, output_filename, logo_path):
     """Generate a PDF for a single pascode for final MEL with interactive form fields."""
@@ -161,7 +174,7 @@ def generate_final_mel_pdf(eligible_data, ineligible_data, senior_rater, senior_
         topMargin=PDF_MARGIN, bottomMargin=PDF_MARGIN
     )
     doc.logo_path = logo_path
-    doc.pas_info = pas_info
+    doc.set_pas_info(pas_info)
     elements = []
     processed_eligible_data = []
     if eligible_data:
@@ -212,6 +225,10 @@ def generate_final_mel_pdf(eligible_data, ineligible_data, senior_rater, senior_
         add_interactive_checkboxes(output_filename, processed_eligible_data, pascode)
     return output_filename
 
+def _build_one_final_pascode(job):
+    """Process pool entry point: build one final MEL pascode PDF from a generate_final_mel_pdf argument tuple."""
+    return generate_final_mel_pdf(*job)
+
 def generate_small_unit_final_mel_pdf(small_unit_data, senior_rater, cycle, melYear, output_filename, logo_path):
     """Generate a separate PDF for small unit data in final MEL."""
     try:
@@ -222,7 +239,7 @@ def generate_small_unit_final_mel_pdf(small_unit_data, senior_rater, cycle, melY
             rightMargin=PDF_MARGIN, leftMargin=PDF_MARGIN,
             topMargin=PDF_MARGIN, bottomMargin=PDF_MARGIN
         )
-        doc.pas_info = {
+        doc.set_pas_info({
             'srid': senior_rater['srid'],
             'fd name': senior_rater['senior_rater_name'],
             'rank': senior_rater['senior_rater_rank'],
@@ -231,7 +248,7 @@ def generate_small_unit_final_mel_pdf(small_unit_data, senior_rater, cycle, melY
             'mp': must_promote,
             'pn': promote_now,
             "is_small_unit": True
-        }
+        })
         doc.logo_path = logo_path
         elements = []
         table = create_final_mel_table(
@@ -242,63 +259,64 @@ def generate_small_unit_final_mel_pdf(small_unit_data, senior_rater, cycle, melY
         doc.build(elements)
         add_interactive_checkboxes(output_filename, srid_list, senior_rater['srid'] + "_SR")
         return output_filename
-    except Exception as e:
-        print(f"Error generating small unit final MEL PDF: {e}")
+    except Exception:
+        logger.exception("Error generating small unit final MEL PDF")
         return None
 
-def generate_final_roster_pdf(session_id, output_filename="final_military_roster.pdf", logo_path=None):
-    """Generate a final MEL PDF with interactive form fields."""
-    session = get_session(session_id)
-    eligible_df = pd.DataFrame.from_records(session['eligible_df'])
-    ineligible_df = pd.DataFrame.from_records(session['ineligible_df'])
-    small_unit_df = pd.DataFrame(session['small_unit_df'])
-    senior_raters = session['srid_pascode_map']
-    cycle = session['cycle']
-    melYear = session['year']
-    pascode_map = session['pascode_map']
-    senior_rater = session['small_unit_sr']
-    if not logo_path: logo_path = os.path.join(images_dir, default_logo)
-    eligible_data = eligible_df.values.tolist()
-    ineligible_data = ineligible_df.values.tolist()
-    unique_pascodes = set()
-    for row in eligible_data + ineligible_data:
-        if len(row) > 7 and row[7] is not None:
-            unique_pascodes.add(row[7])
-    unique_pascodes = sorted(list(unique_pascodes))
-    temp_pdfs = []
-    for pascode in unique_pascodes:
-        if pascode not in pascode_map: continue
-        pascode_eligible = [row for row in eligible_data if len(row) > 7 and row[7] == pascode]
-        pascode_ineligible = [row for row in ineligible_data if len(row) > 7 and row[7] == pascode]
-        if not pascode_eligible and not pascode_ineligible: continue
-        try:
-            if 'ASSIGNED_PAS' in eligible_df.columns:
-                eligible_candidates = (eligible_df['ASSIGNED_PAS'] == pascode).sum()
-            else:
-                eligible_candidates = len(pascode_eligible)
-        except:
+def generate_final_roster_pdf(session_id, logo_path=None, executor=None):
+    """Generate a final MEL PDF with interactive form fields; pascodes render on executor when one is given."""
+    ensure_pdf_fonts()
+    try:
+        session = get_session(session_id)
+        # Session tables are JSON records; group them directly rather than rebuilding DataFrames
+        eligible_records = session['eligible_df']
+        ineligible_records = session['ineligible_df']
+        small_unit_rows = records_to_rows(session['small_unit_df'])
+        senior_raters = session['srid_pascode_map']
+        cycle = session['cycle']
+        melYear = session['year']
+        pascode_map = session['pascode_map']
+        senior_rater = session['small_unit_sr']
+        if not logo_path: logo_path = os.path.join(images_dir, default_logo)
+        eligible_groups = group_by_pascode(eligible_records)
+        ineligible_groups = group_by_pascode(ineligible_records)
+        unique_pascodes = sorted(set(eligible_groups) | set(ineligible_groups))
+        temp_pdfs = []
+        pascode_jobs = []
+        for pascode in unique_pascodes:
+            if pascode not in pascode_map: continue
+            pascode_eligible = pascode_rows(eligible_groups, pascode)
+            pascode_ineligible = pascode_rows(ineligible_groups, pascode)
+            if not pascode_eligible and not pascode_ineligible: continue
             eligible_candidates = len(pascode_eligible)
-        is_small_unit = eligible_candidates <= small_unit_threshold
-        must_promote, promote_now = get_promotion_eligibility(eligible_candidates, cycle)
-        pas_info = {
-            'srid': pascode_map[pascode]['srid'], 'fd name': pascode_map[pascode]['senior_rater_name'],
-            'rank': pascode_map[pascode]['senior_rater_rank'], 'title': pascode_map[pascode]['senior_rater_title'],
-            'fdid': f'{pascode_map[pascode]["srid"]}{pascode[-4:]}', 'srid mpf': pascode[:2],
-            'mp': must_promote, 'pn': promote_now, 'is_small_unit': is_small_unit
-        }
-        temp_filename = f"temp_final_{pascode}.pdf"
-        temp_pdf = generate_final_mel_pdf(
-            pascode_eligible, pascode_ineligible, senior_rater, senior_raters,
-            cycle, melYear, pascode, pas_info, temp_filename, logo_path
-        )
-        if temp_pdf: temp_pdfs.append(temp_pdf)
-    if len(small_unit_df) > 0 and senior_rater:
-        try:
-            small_unit_filename = f"temp_final_small_unit.pdf"
-            small_unit_pdf = generate_small_unit_final_mel_pdf(
-                small_unit_df, senior_rater, cycle, melYear, small_unit_filename, logo_path
-            )
-            if small_unit_pdf: temp_pdfs.append(small_unit_pdf)
-        except Exception as e:
-            print(f"Error generating small unit final MEL PDF: {e}")
-    return merge_pdfs(temp_pdfs, session_id) if temp_pdfs else None
+            is_small_unit = eligible_candidates <= small_unit_threshold
+            must_promote, promote_now = get_promotion_eligibility(eligible_candidates, cycle)
+            pas_info = {
+                'srid': pascode_map[pascode]['srid'], 'fd name': pascode_map[pascode]['senior_rater_name'],
+                'rank': pascode_map[pascode]['senior_rater_rank'], 'title': pascode_map[pascode]['senior_rater_title'],
+                'fdid': f'{pascode_map[pascode]["srid"]}{pascode[-4:]}', 'srid mpf': pascode[:2],
+                'mp': must_promote, 'pn': promote_now, 'is_small_unit': is_small_unit
+            }
+            pascode_jobs.append((
+                pascode_eligible, pascode_ineligible, senior_rater, senior_raters,
+                cycle, melYear, pascode, pas_info, BytesIO(), logo_path
+            ))
+        if pascode_jobs:
+            # Each pascode renders and gets its checkboxes independently, so spread them across the shared pool
+            build = executor.map if executor else map
+            temp_pdfs.extend(pdf for pdf in build(_build_one_final_pascode, pascode_jobs) if pdf)
+        if small_unit_rows and senior_rater:
+            try:
+                small_unit_pdf = generate_small_unit_final_mel_pdf(
+                    small_unit_rows, senior_rater, cycle, melYear, BytesIO(), logo_path
+                )
+                if small_unit_pdf: temp_pdfs.append(small_unit_pdf)
+            except Exception:
+                logger.exception("Error generating small unit final MEL PDF")
+        return merge_pdfs(temp_pdfs) if temp_pdfs else None
+    except BrokenProcessPool:
+        # The caller owns the pool and replaces it
+        raise
+    except Exception:
+        logger.exception("Error generating final roster PDF")
+        return None
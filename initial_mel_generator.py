@@ -1,7 +1,8 @@
-import pandas as pd
 import os
+import logging
 from io import BytesIO
-from fastapi.responses import StreamingResponse
+from datetime import datetime
+from concurrent.futures.process import BrokenProcessPool
 from reportlab.platypus import PageBreak
 from reportlab.lib.units import inch
 
@@ -10,9 +11,11 @@ from session_manager import get_session
 from constants import (
     INITIAL_MEL_HEADER_ROW, INITIAL_MEL_INELIGIBLE_HEADER_ROW,
     INITIAL_MEL_TABLE_WIDTHS, INITIAL_MEL_INELIGIBLE_TABLE_WIDTHS,
-    images_dir, default_logo, PDF_MARGIN
+    images_dir, default_logo, PDF_MARGIN, ensure_pdf_fonts
 )
-from pdf_templates import PDF_Template, create_table, merge_pdfs
+from pdf_templates import PDF_Template, create_table, merge_pdfs, group_by_pascode, pascode_rows, records_to_rows
+
+logger = logging.getLogger(__name__)
 
 
 
@@ -23,7 +26,7 @@ class InitialMELDocument(PDF_Template):
 
 def generate_pascode_pdf(eligible_data, ineligible_data, btz_data, cycle, melYear,
                          pascode, pas_info, output_filename, logo_path):
-    """Generate a PDF for a single pascode."""
+    """Generate a PDF for a single pascode; output_filename may be a path or a writable buffer."""
     try:
         doc = InitialMELDocument(
             output_filename, cycle=cycle, melYear=melYear,
@@ -31,41 +34,51 @@ def generate_pascode_pdf(eligible_data, ineligible_data, btz_data, cycle, melYea
             topMargin=PDF_MARGIN, bottomMargin=PDF_MARGIN
         )
         doc.logo_path = logo_path
-        doc.pas_info = pas_info
-        elements = []
+        doc.set_pas_info(pas_info)
+        sections = []
         if eligible_data and len(eligible_data) > 0:
-            table = create_table(doc, eligible_data, INITIAL_MEL_HEADER_ROW,
-                                 INITIAL_MEL_TABLE_WIDTHS, "ELIGIBLE", len(eligible_data))
-            elements.append(table)
-            elements.append(PageBreak())
+            sections.append(create_table(doc, eligible_data, INITIAL_MEL_HEADER_ROW,
+                                         INITIAL_MEL_TABLE_WIDTHS, "ELIGIBLE", len(eligible_data)))
         if ineligible_data and len(ineligible_data) > 0:
-            table = create_table(doc, ineligible_data, INITIAL_MEL_INELIGIBLE_HEADER_ROW,
-                                 INITIAL_MEL_INELIGIBLE_TABLE_WIDTHS, "INELIGIBLE", len(ineligible_data))
-            elements.append(table)
-            elements.append(PageBreak())
+            sections.append(create_table(doc, ineligible_data, INITIAL_MEL_INELIGIBLE_HEADER_ROW,
+                                         INITIAL_MEL_INELIGIBLE_TABLE_WIDTHS, "INELIGIBLE", len(ineligible_data)))
         if btz_data and len(btz_data) > 0:
-            table = create_table(doc, btz_data, INITIAL_MEL_HEADER_ROW,
-                                 INITIAL_MEL_TABLE_WIDTHS, "BELOW THE ZONE", len(btz_data))
+            sections.append(create_table(doc, btz_data, INITIAL_MEL_HEADER_ROW,
+                                         INITIAL_MEL_TABLE_WIDTHS, "BELOW THE ZONE", len(btz_data)))
+        # Page breaks only separate sections, so the last table does not leave a trailing blank page
+        elements = []
+        for i, table in enumerate(sections):
+            if i:
+                elements.append(PageBreak())
             elements.append(table)
-            elements.append(PageBreak())
         doc.build(elements)
         return output_filename
-    except Exception as e:
-        print(f"Error generating PDF for pascode {pascode}: {e}")
+    except Exception:
+        logger.exception("Error generating PDF for pascode %s", pascode)
         return None
 
-def generate_small_unit_pdf(small_unit_data, senior_rater, cycle, melYear, pas_info, base_filename, logo_path):
-    """Generate PDF for small unit data."""
+def _build_one_pascode(job):
+    """Process pool entry point: build one pascode PDF from a generate_pascode_pdf argument tuple."""
+    return generate_pascode_pdf(*job)
+
+def warm_pdf_worker():
+    """Process pool initializer: register fonts and render a throwaway pascode PDF so the first real job starts warm."""
+    ensure_pdf_fonts()
+    warmup_row = ["WARMUP"] * len(INITIAL_MEL_HEADER_ROW)
+    generate_pascode_pdf([warmup_row], [], [], "SSG", datetime.now().year, "WARMUP", {},
+                         BytesIO(), os.path.join(images_dir, default_logo))
+
+def generate_small_unit_pdf(small_unit_data, senior_rater, cycle, melYear, pas_info, output_filename, logo_path):
+    """Generate PDF for small unit data; output_filename may be a path or a writable buffer."""
     try:
-        small_unit_filename = base_filename.replace('.pdf', '_small_unit.pdf')
         doc = InitialMELDocument(
-            small_unit_filename, cycle=cycle, melYear=melYear,
+            output_filename, cycle=cycle, melYear=melYear,
             rightMargin=PDF_MARGIN, leftMargin=PDF_MARGIN,
             topMargin=PDF_MARGIN, bottomMargin=PDF_MARGIN
         )
         srid_list = small_unit_data.values.tolist() if hasattr(small_unit_data, 'values') else small_unit_data
         must_promote, promote_now = get_promotion_eligibility(len(srid_list), cycle)
-        doc.pas_info = {
+        doc.set_pas_info({
             'srid': senior_rater.get('srid', 'N/A'),
             'fd name': senior_rater.get('senior_rater_name', 'N/A'),
             'rank': senior_rater.get('senior_rater_rank', 'N/A'),
@@ -73,69 +86,61 @@ def generate_small_unit_pdf(small_unit_data, senior_rater, cycle, melYear, pas_i
             'srid mpf': pas_info.get('srid mpf', 'N/A'),
             'mp': must_promote,
             'pn': promote_now
-        }
+        })
         doc.logo_path = logo_path
         elements = []
         table = create_table(doc, srid_list, INITIAL_MEL_HEADER_ROW,
                              INITIAL_MEL_TABLE_WIDTHS, "SENIOR RATER", len(srid_list))
         elements.append(table)
         doc.build(elements)
-        return small_unit_filename
-    except Exception as e:
-        print(f"Error generating small unit PDF: {e}")
+        return output_filename
+    except Exception:
+        logger.exception("Error generating small unit PDF")
         return None
 
-def generate_roster_pdf(session_id, output_filename, logo_path=None):
-    """Generate a military roster PDF from session data."""
+def generate_roster_pdf(session_id, logo_path=None, executor=None):
+    """Generate a military roster PDF from session data; pascodes render on executor when one is given."""
+    ensure_pdf_fonts()
     try:
         session = get_session(session_id)
         if not session:
             return None
-        eligible_df = pd.DataFrame.from_records(session.get('eligible_df', []))
-        ineligible_df = pd.DataFrame.from_records(session.get('ineligible_df', []))
-        btz_df = pd.DataFrame.from_records(session.get('btz_df', []))
-        small_unit_df = pd.DataFrame(session.get('small_unit_df', []))
+        # Session tables are JSON records; group them directly rather than rebuilding DataFrames
+        eligible_records = session.get('eligible_df', [])
+        ineligible_records = session.get('ineligible_df', [])
+        btz_records = session.get('btz_df', [])
+        small_unit_rows = records_to_rows(session.get('small_unit_df', []))
         cycle = session.get('cycle')
         melYear = session.get('year')
         pascode_map = session.get('pascode_map', {})
         senior_rater = session.get('small_unit_sr', {})
         if not logo_path:
             logo_path = os.path.join(images_dir, default_logo)
-        eligible_data = eligible_df.values.tolist() if not eligible_df.empty else []
-        btz_data = btz_df.values.tolist() if not btz_df.empty else []
         ineligible_columns = ['FULL_NAME', 'GRADE', 'ASSIGNED_PAS', 'DAFSC', 'ASSIGNED_PAS_CLEARTEXT', 'REASON']
-        available_columns = [col for col in ineligible_columns if col in ineligible_df.columns]
-        ineligible_data = ineligible_df[available_columns].values.tolist() if not ineligible_df.empty else []
-        unique_pascodes = set()
-        for row in eligible_data:
-            if len(row) > 7:
-                unique_pascodes.add(row[7])
-        for row in ineligible_data:
-            if len(row) > 2:
-                unique_pascodes.add(row[2])
-        for row in btz_data:
-            if len(row) > 7:
-                unique_pascodes.add(row[7])
-        unique_pascodes = sorted(list(unique_pascodes))
+        available_columns = [col for col in ineligible_columns if ineligible_records and col in ineligible_records[0]]
+        eligible_groups = group_by_pascode(eligible_records)
+        ineligible_groups = group_by_pascode(ineligible_records)
+        btz_groups = group_by_pascode(btz_records)
+        unique_pascodes = sorted(set(eligible_groups) | set(ineligible_groups) | set(btz_groups))
         temp_pdfs = []
-        if not unique_pascodes and not small_unit_df.empty and senior_rater:
-            small_unit_temp_filename = f"temp_small_unit.pdf"
+        if not unique_pascodes and small_unit_rows and senior_rater:
             small_unit_pas_info = {
                 'fdid': f'{senior_rater.get("srid", "")}',
                 'srid mpf': senior_rater.get("srid", "")[:2] if senior_rater.get("srid") else 'N/A'
             }
             small_unit_pdf = generate_small_unit_pdf(
-                small_unit_df, senior_rater, cycle, melYear, small_unit_pas_info, small_unit_temp_filename, logo_path
+                small_unit_rows, senior_rater, cycle, melYear, small_unit_pas_info, BytesIO(), logo_path
             )
             if small_unit_pdf:
                 temp_pdfs.append(small_unit_pdf)
-            return merge_pdfs(temp_pdfs, session_id)
+            return merge_pdfs(temp_pdfs)
+        pascode_jobs = []
         for pascode in unique_pascodes:
             if pascode not in pascode_map:
                 continue
-            pascode_eligible = [row for row in eligible_data if len(row) > 7 and row[7] == pascode]
-            pascode_ineligible = [row for row in ineligible_data if len(row) > 2 and row[2] == pascode]
-            pascode_btz = [row for row in btz_data if len(row) > 7 and row[7] == pascode]
+            pascode_eligible = pascode_rows(eligible_groups, pascode)
+            pascode_ineligible = pascode_rows(ineligible_groups, pascode, available_columns)
+            pascode_btz = pascode_rows(btz_groups, pascode)
             if not pascode_eligible and not pascode_ineligible and not pascode_btz:
                 continue
             eligible_candidates = len(pascode_eligible)
@@ -150,25 +155,29 @@ def generate_roster_pdf(session_id, output_filename, logo_path=None):
                 'mp': must_promote,
                 'pn': promote_now
             }
-            temp_filename = f"temp_{pascode}.pdf"
-            temp_pdf = generate_pascode_pdf(
+            # Render into memory; the buffer is returned to the parent and handed straight to the merge
+            pascode_jobs.append((
                 pascode_eligible, pascode_ineligible, pascode_btz, cycle, melYear,
-                pascode, pas_info, temp_filename, logo_path
-            )
-            if temp_pdf:
-                temp_pdfs.append(temp_pdf)
-        if not small_unit_df.empty and senior_rater:
-            small_unit_temp_filename = f"temp_small_unit.pdf"
+                pascode, pas_info, BytesIO(), logo_path
+            ))
+        if pascode_jobs:
+            # Pascode PDFs are independent and CPU-bound, so build them across the shared pool
+            build = executor.map if executor else map
+            temp_pdfs.extend(pdf for pdf in build(_build_one_pascode, pascode_jobs) if pdf)
+        if small_unit_rows and senior_rater:
             small_unit_pas_info = {
                 'fdid': f'{senior_rater.get("srid", "")}',
                 'srid mpf': senior_rater.get("srid", "")[:2] if senior_rater.get("srid") else 'N/A'
             }
             small_unit_pdf = generate_small_unit_pdf(
-                small_unit_df, senior_rater, cycle, melYear, small_unit_pas_info, small_unit_temp_filename, logo_path
+                small_unit_rows, senior_rater, cycle, melYear, small_unit_pas_info, BytesIO(), logo_path
             )
             if small_unit_pdf:
                 temp_pdfs.append(small_unit_pdf)
-        return merge_pdfs(temp_pdfs, session_id)
-    except Exception as e:
-        print(f"Error generating roster PDF: {e}")
+        return merge_pdfs(temp_pdfs)
+    except BrokenProcessPool:
+        # The caller owns the pool and replaces it
+        raise
+    except Exception:
+        logger.exception("Error generating roster PDF")
         return None
@@ -1,21 +1,86 @@
 import os
 import io
-from fastapi import Body, FastAPI, Form, UploadFile, File
-from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+import logging
+import functools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from collections import defaultdict
+from fastapi import FastAPI, Form, UploadFile, File
+from fastapi.responses import ORJSONResponse, StreamingResponse
 import pandas as pd
 from final_mel_generator import generate_final_roster_pdf
-from session_manager import create_session, get_pdf_from_redis, get_session, update_session, delete_session
+from session_manager import create_session, open_pdf_stream, store_pdf_in_redis, update_session, delete_session
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from typing import Dict
-from initial_mel_generator import generate_roster_pdf
+from initial_mel_generator import generate_roster_pdf, warm_pdf_worker
 from roster_processor import roster_processor
 from classes import PasCodeInfo, PasCodeSubmission
 from constants import (
-    REQUIRED_COLUMNS, OPTIONAL_COLUMNS, PDF_COLUMNS,
-    cors_origins, allowed_types, images_dir, default_logo
+    REQUIRED_COLUMNS, OPTIONAL_COLUMNS, COLUMN_DTYPES,
+    cors_origins, images_dir, default_logo, ensure_pdf_fonts
 )
 
-app = FastAPI()
+# Roster parsers keyed by upload content type, so the type check and the parser choice are one lookup
+upload_readers = {
+    "text/csv": functools.partial(
+        pd.read_csv, usecols=list(REQUIRED_COLUMNS + OPTIONAL_COLUMNS), dtype=COLUMN_DTYPES, engine="c"
+    ),
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": functools.partial(
+        pd.read_excel, usecols=list(REQUIRED_COLUMNS + OPTIONAL_COLUMNS), dtype=COLUMN_DTYPES, engine="calamine"
+    ),
+}
+
+# The logo never changes, so resolve its path once; the generators cache its bytes per process
+default_logo_path = os.path.join(images_dir, default_logo)
+
+logger = logging.getLogger(__name__)
+
+# Serializes swapping app.state.pdf_executor after a worker dies
+pdf_executor_lock = threading.Lock()
+
+
+def _new_pdf_executor():
+    # One process pool for the whole app renders pascode PDFs. Workers are spawned rather than forked
+    # so they do not inherit this process's threads, locks or Redis connections, and sharing the pool
+    # keeps concurrent submits from oversubscribing the CPUs
+    max_workers = os.cpu_count() or 1
+    executor = ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=warm_pdf_worker
+    )
+    # Spawned workers start cold and only on demand; one trivial task per worker starts them all now,
+    # so the initializer's warm-up is paid here rather than by the first submit
+    list(executor.map(abs, range(max_workers)))
+    return executor
+
+
+def _replace_pdf_executor(broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+    """Swap a broken pool for a fresh one, once, however many requests saw it break."""
+    with pdf_executor_lock:
+        if app.state.pdf_executor is broken:
+            app.state.pdf_executor = _new_pdf_executor()
+            broken.shutdown(wait=False, cancel_futures=True)
+        return app.state.pdf_executor
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pay the one-time costs at boot rather than on the first request: fonts and the reader here, where
+    # uploads parse and the roster merges, and the reportlab render path in every pool worker
+    ensure_pdf_fonts()
+    pd.read_csv(io.BytesIO(b"a,b\n1,2\n"))
+    app.state.pdf_executor = _new_pdf_executor()
+    try:
+        yield
+    finally:
+        app.state.pdf_executor.shutdown()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,35 +91,22 @@ app.add_middleware(
 )
 
 
-@app.post("/api/upload/initial-mel")
-async def upload_file(
-        file: UploadFile = File(...),
-        cycle: str = Form(...),
-        year: int = Form(...)
-):
+async def _upload_mel(file: UploadFile, cycle: str, year: int):
     return_object = {}
 
-    if file.content_type not in allowed_types:
-        return JSONResponse(content={"error": "Invalid file type. Only CSV or Excel files are allowed."},
-                            status_code=400)
-
-    contents = await file.read()
-
-    if file.filename.endswith(".csv"):
-        df = pd.read_csv(io.BytesIO(contents))
-    elif file.filename.endswith(".xlsx"):
-        df = pd.read_excel(io.BytesIO(contents))
-    else:
-        return JSONResponse(content={"error": "Unsupported file extension."}, status_code=400)
+    reader = upload_readers.get(file.content_type)
+    if reader is None:
+        return ORJSONResponse(content={"error": "Invalid file type. Only CSV or Excel files are allowed."},
+                              status_code=400)
 
-    processed_df = df[REQUIRED_COLUMNS + OPTIONAL_COLUMNS]
-    pdf_df = processed_df[PDF_COLUMNS]
-    session_id = create_session(processed_df, pdf_df)
-    update_session(session_id, cycle=cycle)
-    update_session(session_id, year=year)
-    roster_processor(df, session_id, cycle, year)
+    # Parse straight from the spooled upload rather than buffering another copy in memory
+    file.file.seek(0)
+    df = await run_in_threadpool(reader, file.file)
 
-    session = get_session(session_id)
+    # session_manager is shared with the threaded generators, so its blocking Redis calls run in the threadpool too
+    session_id = await run_in_threadpool(create_session, df)
+    await run_in_threadpool(update_session, session_id, cycle=cycle, year=year)
+    session = await run_in_threadpool(roster_processor, df, session_id, cycle, year)
 
     # Use .get() to safely access session keys that might not exist
     if session.get('pascodes') is not None:
@@ -72,29 +124,84 @@ async def upload_file(
     return_object['session_id'] = session_id
     return_object['errors'] = session.get('error_log', [])
 
-    return JSONResponse(content=return_object)
+    return ORJSONResponse(content=return_object)
+
+
+async def _submit_pascode_info(payload: PasCodeSubmission, generate_pdf, report_name: str):
+    pascode_map = payload.model_dump(include={"pascode_info"})["pascode_info"]
+    if 'small_unit_sr' in pascode_map:
+        small_unit_sr = pascode_map.pop('small_unit_sr')
+    else:
+        small_unit_sr = None
+
+    # Each update_session call is a full Redis read/write, so send the submitted fields together
+    session_updates = {"pascode_map": pascode_map}
+    if small_unit_sr:
+        session_updates["small_unit_sr"] = small_unit_sr
+    session = await run_in_threadpool(update_session, payload.session_id, **session_updates)
+    srid_pascode_map = defaultdict(list)
+
+    for pascode in session['pascodes']:
+        srid_pascode_map[pascode_map[pascode]['srid']].append(pascode)
+
+    await run_in_threadpool(update_session, payload.session_id, srid_pascode_map=dict(srid_pascode_map))
+
+    # Rendering is blocking, so keep it off the event loop. A worker killed mid-render (OOM, segfault)
+    # breaks the whole pool, so replace it and retry once rather than failing every later submit
+    pdf_buffer = None
+    executor = app.state.pdf_executor
+    for attempt in range(2):
+        try:
+            pdf_buffer = await run_in_threadpool(generate_pdf, payload.session_id, logo_path=default_logo_path,
+                                                 executor=executor)
+            break
+        except BrokenProcessPool:
+            logger.exception("PDF worker pool broke while rendering %s (attempt %d)", report_name, attempt + 1)
+            executor = await run_in_threadpool(_replace_pdf_executor, executor)
+
+    if pdf_buffer:
+        # Keep a copy for the download route, then stream the same in-memory buffer back
+        await run_in_threadpool(store_pdf_in_redis, payload.session_id, pdf_buffer)
+        pdf_buffer.seek(0)
+        return StreamingResponse(
+            pdf_buffer,
+            media_type='application/pdf',
+            headers={
+                "Content-Disposition": f"attachment; filename={report_name}.pdf"
+            }
+        )
+    return ORJSONResponse(content={"error": "PDF generation failed"}, status_code=500)
+
+
+@app.post("/api/upload/initial-mel")
+async def upload_file(
+        file: UploadFile = File(...),
+        cycle: str = Form(...),
+        year: int = Form(...)
+):
+    return await _upload_mel(file, cycle, year)
 
 
 @app.get("/api/download/initial-mel/{session_id}")
 async def download_initial_mel(session_id: str):
     try:
-        pdf_buffer: io.BytesIO | None = get_pdf_from_redis(session_id)
-
-        if not pdf_buffer:
-            return JSONResponse(
+        # The first chunk is read before responding, so a missing PDF or a Redis error still gets a proper status
+        pdf_stream = await run_in_threadpool(open_pdf_stream, session_id)
+        if pdf_stream is None:
+            return ORJSONResponse(
                 content={"error": "PDF not found for this session"},
                 status_code=404
             )
 
         return StreamingResponse(
-            pdf_buffer,
+            pdf_stream,
             media_type='application/pdf',
             headers={
                 "Content-Disposition": f"attachment; filename=initial_mel_roster.pdf"
             }
         )
     except Exception as e:
-        return JSONResponse(
+        return ORJSONResponse(
             content={"error": f"Failed to retrieve PDF: {str(e)}"},
             status_code=500
         )
@@ -102,37 +209,7 @@ async def download_initial_mel(session_id: str):
 
 @app.post("/api/initial-mel/submit/pascode-info")
 async def submit_pascode_info(payload: PasCodeSubmission):
-    pascode_map = {pascode: info.model_dump() for pascode, info in payload.pascode_info.items()}
-    if 'small_unit_sr' in pascode_map:
-        small_unit_sr = pascode_map.pop('small_unit_sr')
-    else:
-        small_unit_sr = None
-
-    if small_unit_sr:
-        update_session(payload.session_id, small_unit_sr=small_unit_sr)
-    update_session(payload.session_id, pascode_map=pascode_map)
-    srid_pascode_map = {}
-    session = get_session(payload.session_id)
-
-    for pascode in session['pascodes']:
-        srid = session['pascode_map'][pascode]['srid']
-        if srid in srid_pascode_map:
-            srid_pascode_map[srid].append(pascode)
-        else:
-            srid_pascode_map[srid] = [pascode]
-
-    update_session(payload.session_id, srid_pascode_map=srid_pascode_map)
-
-    # Use constants for logo path
-    logo_path = os.path.join(images_dir, default_logo)
-
-    response = generate_roster_pdf(payload.session_id,
-                                   output_filename=rf"tmp/{payload.session_id}_initial_mel_roster.pdf",
-                                   logo_path=logo_path)
-
-    if response:
-        return response
-    return JSONResponse(content={"error": "PDF generation failed"}, status_code=500)
+    return await _submit_pascode_info(payload, generate_roster_pdf, "initial_mel_roster")
 
 
 @app.post("/api/upload/final-mel")
@@ -141,104 +218,34 @@ async def upload_final_mel_file(
         cycle: str = Form(...),
         year: int = Form(...)
 ):
-    return_object = {}
-
-    if file.content_type not in allowed_types:
-        return JSONResponse(content={"error": "Invalid file type. Only CSV or Excel files are allowed."},
-                            status_code=400)
-
-    contents = await file.read()
-
-    if file.filename.endswith(".csv"):
-        df = pd.read_csv(io.BytesIO(contents))
-    elif file.filename.endswith(".xlsx"):
-        df = pd.read_excel(io.BytesIO(contents))
-    else:
-        return JSONResponse(content={"error": "Unsupported file extension."}, status_code=400)
-
-    processed_df = df[REQUIRED_COLUMNS + OPTIONAL_COLUMNS]
-    pdf_df = processed_df[PDF_COLUMNS]
-    session_id = create_session(processed_df, pdf_df)
-    update_session(session_id, cycle=cycle)
-    update_session(session_id, year=year)
-    roster_processor(df, session_id, cycle, year)
-
-    session = get_session(session_id)
-
-    # Use .get() to safely access session keys that might not exist
-    if session.get('pascodes') is not None:
-        return_object['pascodes'] = session['pascodes']
-
-    if session.get('pascode_unit_map') is not None:
-        return_object['pascode_unit_map'] = session['pascode_unit_map']
-
-    if session.get('small_unit_df') is not None:
-        return_object['senior_rater_needed'] = True
-    else:
-        return_object["senior_rater_needed"] = False
-
-    return_object['message'] = "Upload successful."
-    return_object['session_id'] = session_id
-    return_object['errors'] = session.get('error_log', [])
-
-    return JSONResponse(content=return_object)
+    return await _upload_mel(file, cycle, year)
 
 
 @app.post("/api/final-mel/submit/pascode-info")
 async def submit_final_pascode_info(payload: PasCodeSubmission):
-    pascode_map = {pascode: info.model_dump() for pascode, info in payload.pascode_info.items()}
-    if 'small_unit_sr' in pascode_map:
-        small_unit_sr = pascode_map.pop('small_unit_sr')
-    else:
-        small_unit_sr = None
-
-    if small_unit_sr:
-        update_session(payload.session_id, small_unit_sr=small_unit_sr)
-    update_session(payload.session_id, pascode_map=pascode_map)
-    srid_pascode_map = {}
-    session = get_session(payload.session_id)
-
-    for pascode in session['pascodes']:
-        srid = session['pascode_map'][pascode]['srid']
-        if srid in srid_pascode_map:
-            srid_pascode_map[srid].append(pascode)
-        else:
-            srid_pascode_map[srid] = [pascode]
-
-    update_session(payload.session_id, srid_pascode_map=srid_pascode_map)
-
-    # Use constants for logo path
-    logo_path = os.path.join(images_dir, default_logo)
-
-    response = generate_final_roster_pdf(payload.session_id,
-                                         output_filename=rf"tmp/{payload.session_id}_final_mel_roster.pdf",
-                                         logo_path=logo_path)
-
-    if response:
-        return response
-    return JSONResponse(content={"error": "PDF generation failed"}, status_code=500)
+    return await _submit_pascode_info(payload, generate_final_roster_pdf, "final_mel_roster")
 
 
 @app.get("/api/download/final-mel/{session_id}")
 async def download_final_mel(session_id: str):
     try:
-        pdf_buffer: io.BytesIO | None = get_pdf_from_redis(session_id)
-
-        if not pdf_buffer:
-            return JSONResponse(
+        # The first chunk is read before responding, so a missing PDF or a Redis error still gets a proper status
+        pdf_stream = await run_in_threadpool(open_pdf_stream, session_id)
+        if pdf_stream is None:
+            return ORJSONResponse(
                 content={"error": "PDF not found for this session"},
                 status_code=404
             )
 
         return StreamingResponse(
-            pdf_buffer,
+            pdf_stream,
             media_type='application/pdf',
             headers={
                 "Content-Disposition": f"attachment; filename=final_mel_roster.pdf"
             }
         )
     except Exception as e:
-        return JSONResponse(
+        return ORJSONResponse(
             content={"error": f"Failed to retrieve PDF: {str(e)}"},
             status_code=500
         )
\ No newline at end of file
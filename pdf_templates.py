@@ -1,14 +1,16 @@
 import os
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
+import logging
+import functools
 from io import BytesIO
-from fastapi.responses import StreamingResponse
+from types import SimpleNamespace
+from datetime import datetime, timedelta
 from reportlab.platypus import PageBreak, Table, TableStyle, Frame
 from reportlab.platypus.doctemplate import PageTemplate, BaseDocTemplate
 from reportlab.lib.pagesizes import landscape, letter
 from reportlab.lib import colors
 from reportlab.lib.units import inch
-from PyPDF2 import PdfMerger
+import pikepdf
+import numpy as np
 from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.platypus import Image
 
@@ -21,10 +23,26 @@ from constants import (
     PDF_CUI_HEADER, PDF_FOOTER_DISCLAIMER, PDF_FOOTER_CUI,
     PDF_FONT_SIZE_CUI, PDF_FONT_SIZE_HEADER, PDF_FONT_SIZE_SUBHEADER,
     PDF_FONT_SIZE_FOOTER, PDF_FONT_SIZE_FOOTER_BOTTOM,
-    BODY_FONT, BOLD_FONT, PROMOTION_MAP, date_display_format,
-    PDF_LOGO_SIZE, PDF_LOGO_X, PDF_LOGO_Y_OFFSET, SCODS
+    ensure_pdf_fonts, PROMOTION_MAP, date_display_format,
+    PDF_LOGO_SIZE, PDF_LOGO_X, PDF_LOGO_Y_OFFSET, SCODS_PARSED
 )
 
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=8)
+def _logo_bytes(logo_path):
+    """Read a logo file once per process; None when the file does not exist."""
+    if not os.path.exists(logo_path):
+        return None
+    with open(logo_path, 'rb') as logo_file:
+        return logo_file.read()
+
+@functools.lru_cache(maxsize=4096)
+def _cached_width(text, font, size):
+    """Memoized stringWidth; footer words and labels repeat across every page and document."""
+    return stringWidth(text, font, size)
+
 
 class PDF_Template(BaseDocTemplate):
     def __init__(self, filename, cycle, melYear, **kwargs):
@@ -34,7 +52,20 @@ class PDF_Template(BaseDocTemplate):
         self.cycle = cycle
         self.melYear = melYear
         self.logo_path = None
-        self.pas_info = {}
+        self._logo = None
+        self.set_pas_info({})
+        self._page_form_built = False
+        self.body_font, self.bold_font = ensure_pdf_fonts()
+
+        # Footer text is identical on every page, so wrap and measure it once per document
+        from initial_mel_generator import InitialMELDocument
+        self._footer_lines = self._wrap_text(PDF_FOOTER_DISCLAIMER, PDF_FOOTER_TEXT_Y)
+        self._cui_width = _cached_width(PDF_FOOTER_CUI, self.bold_font, PDF_FONT_SIZE_FOOTER_BOTTOM)
+        self._identifier_text = f"{str(self.melYear + 1)[-2:]}{PROMOTION_MAP.get(self.cycle, 'XX')} - {'Initial MEL' if isinstance(self, InitialMELDocument) else 'Final MEL'}"
+        self._identifier_width = _cached_width(self._identifier_text, self.bold_font, PDF_FONT_SIZE_FOOTER_BOTTOM)
+        self._accounting_text = f"Accounting Date: {self._get_accounting_date()}"
+        self._accounting_width = _cached_width(self._accounting_text, self.bold_font, PDF_FONT_SIZE_FOOTER_BOTTOM)
+        self._today_text = datetime.now().strftime(date_display_format)
 
         # Create content frame using constants
         content_frame = Frame(
@@ -52,19 +83,42 @@ class PDF_Template(BaseDocTemplate):
         )
         self.addPageTemplates([template])
 
+    def set_pas_info(self, pas_info):
+        """Attach the unit's PAS details and resolve the header fields once for the whole document."""
+        self.pas_info = pas_info
+        officer_name = pas_info.get('fd name', 'N/A')
+        rank = pas_info.get('rank', 'N/A')
+        self._pas = SimpleNamespace(
+            srid=pas_info.get('srid', 'N/A'),
+            fd_name=officer_name,
+            fdid=pas_info.get('fdid', 'N/A'),
+            srid_mpf=pas_info.get('srid mpf', 'N/A'),
+            pn=pas_info.get('pn', 'NA'),
+            mp=pas_info.get('mp', 'N/A'),
+            is_small_unit=pas_info.get('is_small_unit', False),
+            signature=f"{officer_name}, {rank}, USAF",
+            title=pas_info.get('title', 'N/A'),
+        )
+
     def add_page_elements(self, canvas, doc):
         """Add header and footer to each page."""
         canvas.saveState()
         try:
-            self.add_header(canvas, doc)
-            self.add_footer(canvas, doc)
-        except Exception as e:
-            print(f"Error adding page elements: {e}")
+            # Header and footer content is fixed for the document, so draw it once as a form and stamp it per page
+            if not self._page_form_built:
+                canvas.beginForm('page_elements')
+                self.add_header(canvas, doc)
+                self.add_footer(canvas, doc)
+                canvas.endForm()
+                self._page_form_built = True
+            canvas.doForm('page_elements')
+        except Exception:
+            logger.exception("Error adding page elements")
         canvas.restoreState()
 
     def add_header(self, canvas, doc):
         """Add header section to page."""
-        canvas.setFont(BOLD_FONT, PDF_FONT_SIZE_CUI)
+        canvas.setFont(self.bold_font, PDF_FONT_SIZE_CUI)
         canvas.drawCentredString(self.page_width / 2, PDF_HEADER_CUI_Y, PDF_CUI_HEADER)
         header_top = PDF_HEADER_MAIN_Y
         self._add_logo(canvas, doc, header_top)
@@ -72,182 +126,220 @@ class PDF_Template(BaseDocTemplate):
         self._add_promotion_data(canvas, doc, header_top)
         self._add_signature_block(canvas, doc, header_top)
 
+    def _prepare_logo(self):
+        """Resolve the logo once per document; False marks a missing or unset logo."""
+        if self._logo is None:
+            logo_bytes = _logo_bytes(self.logo_path) if self.logo_path else None
+            if logo_bytes:
+                self._logo = Image(BytesIO(logo_bytes), width=PDF_LOGO_SIZE, height=PDF_LOGO_SIZE)
+            else:
+                self._logo = False
+        return self._logo
+
     def _add_logo(self, canvas, doc, header_top):
         """Add logo to header."""
         try:
-            if doc.logo_path and os.path.exists(doc.logo_path):
-                logo = Image(doc.logo_path, width=PDF_LOGO_SIZE, height=PDF_LOGO_SIZE)
+            logo = doc._prepare_logo()
+            if logo:
                 logo.drawOn(canvas, PDF_LOGO_X, header_top - PDF_LOGO_Y_OFFSET)
-        except Exception as e:
-            print(f"Error adding logo: {e}")
+        except Exception:
+            logger.exception("Error adding logo")
 
     def _add_unit_data(self, canvas, doc, header_top):
         """Add unit data section."""
-        canvas.setFont(BOLD_FONT, PDF_FONT_SIZE_HEADER)
+        canvas.setFont(self.bold_font, PDF_FONT_SIZE_HEADER)
         title_y = header_top + 0.1 * inch
         canvas.drawString(PDF_HEADER_UNIT_DATA_X, title_y, "Unit Data")
-        pas_info = doc.pas_info
-        canvas.setFont(BOLD_FONT, PDF_FONT_SIZE_SUBHEADER)
+        pas = doc._pas
         text_start_y = header_top - 0.1 * inch
-        canvas.drawString(PDF_HEADER_UNIT_DATA_X, text_start_y, f"SRID: {pas_info.get('srid', 'N/A')}")
         if self.cycle not in ['SMS', 'MSG']:
-            canvas.drawString(PDF_HEADER_UNIT_DATA_X, text_start_y - PDF_HEADER_LINE_HEIGHT,
-                              f"FD NAME: {pas_info.get('fd name', 'N/A')}")
-            canvas.drawString(PDF_HEADER_UNIT_DATA_X, text_start_y - 2 * PDF_HEADER_LINE_HEIGHT,
-                              f"FDID: {pas_info.get('fdid', 'N/A')}")
-            canvas.drawString(PDF_HEADER_UNIT_DATA_X, text_start_y - 3 * PDF_HEADER_LINE_HEIGHT,
-                              f"SRID MPF: {pas_info.get('srid mpf', 'N/A')}")
+            lines = [f"SRID: {pas.srid}", f"FD NAME: {pas.fd_name}", f"FDID: {pas.fdid}", f"SRID MPF: {pas.srid_mpf}"]
         else:
-            canvas.drawString(PDF_HEADER_UNIT_DATA_X, text_start_y - PDF_HEADER_LINE_HEIGHT,
-                              f"SRID MPF: {pas_info.get('srid mpf', 'N/A')}")
+            lines = [f"SRID: {pas.srid}", f"SRID MPF: {pas.srid_mpf}"]
+        self._draw_lines(canvas, PDF_HEADER_UNIT_DATA_X, text_start_y, lines, PDF_FONT_SIZE_SUBHEADER)
 
     def _add_promotion_data(self, canvas, doc, header_top):
         """Add promotion eligibility data section."""
-        pas_info = doc.pas_info
-        if pas_info.get('pn', 'NA') != 'NA':
-            canvas.setFont(BOLD_FONT, PDF_FONT_SIZE_HEADER)
+        pas = doc._pas
+        if pas.pn != 'NA':
+            canvas.setFont(self.bold_font, PDF_FONT_SIZE_HEADER)
             title_y = header_top + 0.1 * inch
             canvas.drawString(PDF_HEADER_PROMOTION_X, title_y, "Promotion Eligibility Data")
-            canvas.setFont(BOLD_FONT, PDF_FONT_SIZE_SUBHEADER)
             text_start_y = header_top - 0.1 * inch
-            canvas.drawString(PDF_HEADER_PROMOTION_X, text_start_y,
-                              f"PROMOTE NOW: {pas_info.get('pn', 'N/A')}")
-            canvas.drawString(PDF_HEADER_PROMOTION_X, text_start_y - PDF_HEADER_LINE_HEIGHT,
-                              f"MUST PROMOTE: {pas_info.get('mp', 'N/A')}")
-            if pas_info.get('is_small_unit', False):
-                canvas.drawString(PDF_HEADER_PROMOTION_X, text_start_y - 2 * PDF_HEADER_LINE_HEIGHT,
-                                  "UNIT SIZE: SMALL")
+            lines = [f"PROMOTE NOW: {pas.pn}", f"MUST PROMOTE: {pas.mp}"]
+            if pas.is_small_unit:
+                lines.append("UNIT SIZE: SMALL")
+            self._draw_lines(canvas, PDF_HEADER_PROMOTION_X, text_start_y, lines, PDF_FONT_SIZE_SUBHEADER)
 
     def _add_signature_block(self, canvas, doc, header_top):
         """Add signature block."""
-        pas_info = doc.pas_info
-        canvas.setFont(BOLD_FONT, PDF_FONT_SIZE_HEADER)
+        pas = doc._pas
         title_y = header_top - 0.5 * inch
-        officer_name = pas_info.get('fd name', 'N/A')
-        rank = pas_info.get('rank', 'N/A')
-        title = pas_info.get('title', 'N/A')
-        canvas.drawString(PDF_HEADER_SIGNATURE_X, title_y, f"{officer_name}, {rank}, USAF")
-        canvas.drawString(PDF_HEADER_SIGNATURE_X, title_y - PDF_HEADER_LINE_HEIGHT, title)
+        self._draw_lines(canvas, PDF_HEADER_SIGNATURE_X, title_y, [pas.signature, pas.title], PDF_FONT_SIZE_HEADER)
+
+    def _draw_lines(self, canvas, x, y, lines, font_size):
+        """Draw lines downward from (x, y), one header line height apart, as a single text object."""
+        text = canvas.beginText(x, y)
+        text.setFont(self.bold_font, font_size, leading=PDF_HEADER_LINE_HEIGHT)
+        for line in lines:
+            text.textLine(line)
+        canvas.drawText(text)
 
     def add_footer(self, canvas, doc):
         """Add footer section."""
         canvas.setLineWidth(0.1)
         canvas.setStrokeColorRGB(0, 0, 0)
         canvas.line(PDF_MARGIN, PDF_FOOTER_BORDER_Y, self.page_width - PDF_MARGIN, PDF_FOOTER_BORDER_Y)
-        self._draw_wrapped_text(canvas, PDF_FOOTER_DISCLAIMER, PDF_FOOTER_TEXT_Y)
+        self._draw_wrapped_text(canvas, self._footer_lines)
         self._add_bottom_footer(canvas, doc)
 
-    def _draw_wrapped_text(self, canvas, text, y_position):
-        """Draw text wrapped to multiple lines."""
-        canvas.setFont(BOLD_FONT, PDF_FONT_SIZE_FOOTER)
+    def _wrap_text(self, text, y_position):
+        """Wrap text between the page margins into centered (line, x, y) draw positions."""
         words = text.split()
-        lines = []
-        current_line = []
-        current_width = 0
+        if not words:
+            return []
         max_width = self.page_width - (2 * PDF_MARGIN)
-        for word in words:
-            word_width = stringWidth(word + ' ', BOLD_FONT, PDF_FONT_SIZE_FOOTER)
-            if current_width + word_width <= max_width:
-                current_line.append(word)
-                current_width += word_width
-            else:
-                lines.append(' '.join(current_line))
-                current_line = [word]
-                current_width = word_width
-        if current_line:
-            lines.append(' '.join(current_line))
+        # First-fit over cumulative word widths: each line ends at the last word whose running total still fits
+        cumulative = np.cumsum([_cached_width(word + ' ', self.bold_font, PDF_FONT_SIZE_FOOTER) for word in words])
+        lines = []
+        start = 0
+        while start < len(words):
+            offset = cumulative[start - 1] if start else 0.0
+            end = max(int(np.searchsorted(cumulative, offset + max_width, side='right')), start + 1)
+            lines.append(' '.join(words[start:end]))
+            start = end
+        positioned = []
         for i, line in enumerate(lines):
-            line_width = stringWidth(line, BOLD_FONT, PDF_FONT_SIZE_FOOTER)
-            center_x = (self.page_width - line_width) / 2
-            canvas.drawString(center_x, y_position + (len(lines) - 1 - i) * 10, line)
+            center_x = (self.page_width - _cached_width(line, self.bold_font, PDF_FONT_SIZE_FOOTER)) / 2
+            positioned.append((line, center_x, y_position + (len(lines) - 1 - i) * 10))
+        return positioned
+
+    def _draw_wrapped_text(self, canvas, lines):
+        """Draw pre-wrapped (line, x, y) positions."""
+        canvas.setFont(self.bold_font, PDF_FONT_SIZE_FOOTER)
+        for line, x, y in lines:
+            canvas.drawString(x, y, line)
 
     def _add_bottom_footer(self, canvas, doc):
         """Add bottom footer elements."""
-        from initial_mel_generator import InitialMELDocument
         canvas.setFillColorRGB(0, 0, 0)
-        canvas.setFont(BOLD_FONT, PDF_FONT_SIZE_FOOTER_BOTTOM)
-        canvas.drawString(PDF_MARGIN, PDF_FOOTER_BOTTOM_Y, datetime.now().strftime(date_display_format))
-        cui_width = stringWidth(PDF_FOOTER_CUI, BOLD_FONT, PDF_FONT_SIZE_FOOTER_BOTTOM)
-        cui_center_x = (self.page_width / 2) - (cui_width / 2)
-        canvas.drawString(cui_center_x, PDF_FOOTER_BOTTOM_Y, PDF_FOOTER_CUI)
-        identifier_text = f"{str(self.melYear + 1)[-2:]}{PROMOTION_MAP.get(self.cycle, 'XX')} - {'Initial MEL' if isinstance(doc, InitialMELDocument) else 'Final MEL'}"
-        identifier_width = stringWidth(identifier_text, BOLD_FONT, PDF_FONT_SIZE_FOOTER_BOTTOM)
-        identifier_center_x = (self.page_width / 2) - (identifier_width / 2)
-        canvas.drawString(identifier_center_x, PDF_FOOTER_BOTTOM_Y - 18, identifier_text)
-        accounting_text = f"Accounting Date: {self._get_accounting_date()}"
-        accounting_width = stringWidth(accounting_text, BOLD_FONT, PDF_FONT_SIZE_FOOTER_BOTTOM)
-        canvas.drawString(self.page_width - PDF_MARGIN - accounting_width, PDF_FOOTER_BOTTOM_Y, accounting_text)
+        cui_center_x = (self.page_width / 2) - (self._cui_width / 2)
+        identifier_center_x = (self.page_width / 2) - (self._identifier_width / 2)
+        # All bottom footer strings share one font, so emit them from a single text object
+        text = canvas.beginText()
+        text.setFont(self.bold_font, PDF_FONT_SIZE_FOOTER_BOTTOM)
+        for x, y, value in (
+            (PDF_MARGIN, PDF_FOOTER_BOTTOM_Y, self._today_text),
+            (cui_center_x, PDF_FOOTER_BOTTOM_Y, PDF_FOOTER_CUI),
+            (identifier_center_x, PDF_FOOTER_BOTTOM_Y - 18, self._identifier_text),
+            (self.page_width - PDF_MARGIN - self._accounting_width, PDF_FOOTER_BOTTOM_Y, self._accounting_text),
+        ):
+            text.setTextOrigin(x, y)
+            text.textOut(value)
+        canvas.drawText(text)
 
     def _get_accounting_date(self):
         """Calculate accounting date."""
         try:
-            scod = f'{SCODS.get(self.cycle)}-{self.melYear}'
-            formatted_scod_date = datetime.strptime(scod, "%d-%b-%Y")
-            accounting_date = formatted_scod_date - relativedelta(days=119)
+            scod_day, scod_month = SCODS_PARSED[self.cycle]
+            formatted_scod_date = datetime(self.melYear, scod_month, scod_day)
+            accounting_date = formatted_scod_date - timedelta(days=119)
             adjusted_accounting_date = accounting_date.replace(day=3, hour=23, minute=59, second=59)
             return adjusted_accounting_date.strftime(date_display_format)
-        except Exception as e:
-            print(f"Error calculating accounting date: {e}")
+        except Exception:
+            logger.exception("Error calculating accounting date")
             return "Error calculating date"
 
-def create_table(doc, data, header, col_widths, table_type=None, count=None):
-    """Create a generic table with consistent styling."""
-    table_width = doc.page_width - (2 * PDF_MARGIN)
-    col_widths = [table_width * x for x in col_widths]
-    table_data = [header] + data
-    repeat_rows = 1
-    if table_type and count is not None:
-        status_row = [table_type] + [""] * (len(header) - 2) + [f"Total: {count}"]
-        table_data = [status_row] + table_data
-        repeat_rows = 2
-    table = Table(table_data, repeatRows=repeat_rows, colWidths=col_widths)
+@functools.lru_cache(maxsize=16)
+def _table_style(repeat_rows, column_count, bold_font, body_font):
+    """Build the shared roster TableStyle once per header shape; TableStyle is safe to reuse across tables."""
     style = [
         ('BACKGROUND', (0, 0), (-1, repeat_rows - 1), PDF_HEADER_COLOR),
         ('TEXTCOLOR', (0, 0), (-1, repeat_rows - 1), colors.white),
-        ('FONTNAME', (0, 0), (-1, repeat_rows - 1), BOLD_FONT),
+        ('FONTNAME', (0, 0), (-1, repeat_rows - 1), bold_font),
         ('FONTSIZE', (0, 0), (-1, repeat_rows - 1), PDF_FONT_SIZE_HEADER),
         ('BOTTOMPADDING', (0, 0), (-1, repeat_rows - 1), 4),
         ('ROWHEIGHT', (0, 0), (-1, -1), 30),
-        ('FONTNAME', (0, repeat_rows), (-1, -1), BODY_FONT),
+        ('FONTNAME', (0, repeat_rows), (-1, -1), body_font),
         ('FONTSIZE', (0, repeat_rows), (-1, -1), PDF_FONT_SIZE_SUBHEADER),
         ('LINEBELOW', (0, 0), (-1, -1), .5, colors.lightgrey),
         ('ALIGN', (0, repeat_rows), (0, -1), 'LEFT'),
         ('ALIGN', (1, repeat_rows), (1, -1), 'CENTER'),
         ('VALIGN', (0, repeat_rows), (-1, -1), 'MIDDLE'),
     ]
-    if table_type and count is not None:
+    if repeat_rows == 2:
         style.extend([
-            ('SPAN', (0, 0), (len(header) - 2, 0)),
-            ('ALIGN', (len(header) - 1, 0), (len(header) - 1, 0), 'RIGHT'),
+            ('SPAN', (0, 0), (column_count - 2, 0)),
+            ('ALIGN', (column_count - 1, 0), (column_count - 1, 0), 'RIGHT'),
         ])
-    table.setStyle(TableStyle(style))
+    return TableStyle(style)
+
+def create_table(doc, data, header, col_widths, table_type=None, count=None):
+    """Create a generic table with consistent styling."""
+    table_width = doc.page_width - (2 * PDF_MARGIN)
+    col_widths = [table_width * x for x in col_widths]
+    # Build the leading rows first and extend once, so the data rows are never copied twice
+    table_data = []
+    repeat_rows = 1
+    if table_type and count is not None:
+        table_data.append([table_type] + [""] * (len(header) - 2) + [f"Total: {count}"])
+        repeat_rows = 2
+    table_data.append(header)
+    table_data.extend(data)
+    table = Table(table_data, repeatRows=repeat_rows, colWidths=col_widths)
+    table.setStyle(_table_style(repeat_rows, len(header), doc.bold_font, doc.body_font))
     return table
 
-def merge_pdfs(temp_pdfs, session_id):
-    """Merge multiple PDFs into a single PDF."""
+def group_by_pascode(records):
+    """Split session roster records into {pascode: records} in a single pass."""
+    groups = {}
+    for record in records:
+        pascode = record.get('ASSIGNED_PAS')
+        if pascode is not None:
+            groups.setdefault(pascode, []).append(record)
+    return groups
+
+def pascode_rows(groups, pascode, columns=None):
+    """Materialize one pascode's records as row lists, only when its PDF is built."""
+    records = groups.get(pascode, [])
+    if columns is None:
+        return records_to_rows(records)
+    return [[record[column] for column in columns] for record in records]
+
+def records_to_rows(records):
+    """Convert session records to row lists in column order."""
+    return [list(record.values()) for record in records]
+
+def merge_pdfs(temp_pdfs):
+    """Merge in-memory PDF buffers into a single PDF and return it as a rewound buffer."""
     if not temp_pdfs:
         return None
-    merger = PdfMerger()
+    merged = pikepdf.Pdf.new()
+    sources = []
     try:
-        for pdf_path in temp_pdfs:
-            if pdf_path and os.path.exists(pdf_path):
-                merger.append(pdf_path)
+        for pdf in temp_pdfs:
+            if not pdf:
+                continue
+            pdf.seek(0)
+            # qpdf copies page objects structurally; sources stay open until the merged file is saved
+            source = pikepdf.Pdf.open(pdf)
+            sources.append(source)
+            merged.pages.extend(source.pages)
         buffer = BytesIO()
-        merger.write(buffer)
-        merger.close()
-        buffer.seek(0)
-        return StreamingResponse(
+        # Pack objects into compressed object streams; ReportLab's content streams are already flated, so pass them through
+        merged.save(
             buffer,
-            media_type="application/pdf",
-            headers={"Content-Disposition": "attachment; filename=merged_roster.pdf"}
+            object_stream_mode=pikepdf.ObjectStreamMode.generate,
+            stream_decode_level=pikepdf.StreamDecodeLevel.none,
+            recompress_flate=False,
+            linearize=False
         )
-    except Exception as e:
-        print(f"Error during PDF merge: {e}")
+        buffer.seek(0)
+        return buffer
+    except Exception:
+        logger.exception("Error during PDF merge")
         return None
     finally:
-        for path in temp_pdfs:
-            if path and os.path.exists(path):
-                try:
-                    os.remove(path)
-                except Exception as e:
-                    print(f"Warning: could not delete {path}: {e}")
+        for source in sources:
+            source.close()
+        merged.close()
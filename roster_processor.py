@@ -1,9 +1,11 @@
 # In roster_processor.py
 
+import sys
 import pandas as pd
 from accounting_date_check import accounting_date_check
 from board_filter import board_filter
-from session_manager import update_session, get_session
+from classes import RosterMember
+from session_manager import update_session
 from constants import (
     REQUIRED_COLUMNS, OPTIONAL_COLUMNS, PDF_COLUMNS,
     GRADE_MAP, PROMOTIONAL_MAP, small_unit_threshold, max_unit_length,
@@ -43,16 +45,21 @@ def roster_processor(roster_df, session_id, cycle, year):
 
     error_log = []
 
-    all_roster_columns = REQUIRED_COLUMNS + OPTIONAL_COLUMNS
+    all_roster_columns = list(REQUIRED_COLUMNS + OPTIONAL_COLUMNS)
 
     missing_columns = [col for col in all_roster_columns if col not in roster_df.columns]
     if missing_columns:
         error_log.append(f"Missing required columns: {', '.join(missing_columns)}")
-        update_session(session_id, error_log=error_log)
-        return
+        return update_session(session_id, error_log=error_log)
 
     filtered_roster_df = roster_df[all_roster_columns].copy()
 
+    # Intern categorical codes once so mapping lookups and board_filter cache keys hit the identity fast path
+    for col in ['GRADE', 'ASSIGNED_PAS', 'DAFSC', 'REENL_ELIG_STATUS', 'PAFSC']:
+        filtered_roster_df[col] = filtered_roster_df[col].map(
+            lambda value: sys.intern(value) if isinstance(value, str) else value
+        )
+
     # Parse all date columns in the DataFrame ONCE, before processing
     date_columns = ['DOR', 'UIF_DISPOSITION_DATE', 'TAFMSD', 'DATE_ARRIVED_STATION']
     for col in date_columns:
@@ -61,66 +68,82 @@ def roster_processor(roster_df, session_id, cycle, year):
                 lambda x: parse_date(x, error_log, None)
             )
 
+    # Normalize missing optional values to None so identical members share board_filter cache entries
+    optional_values = filtered_roster_df[list(OPTIONAL_COLUMNS)].astype(object)
+    filtered_roster_df[list(OPTIONAL_COLUMNS)] = optional_values.where(optional_values.notna(), None)
+
+    # Bind loop-invariant globals to locals so the per-row pass uses fast local lookups
+    officer_ranks = OFFICER_RANKS
+    enlisted_ranks = ENLISTED_RANKS
+    required_columns = REQUIRED_COLUMNS
+    promotional_grade = PROMOTIONAL_MAP.get(cycle)
+    check_accounting_date = accounting_date_check
+    check_board = board_filter
+
+    # Flag missing required data for the whole roster in one vectorized pass
+    missing_mask = filtered_roster_df[list(required_columns)].isna().to_numpy()
+    row_missing = missing_mask.any(axis=1).tolist()
+    first_missing = missing_mask.argmax(axis=1).tolist()
+
     # Processing loop - now working with properly parsed datetime objects
-    for index, row in filtered_roster_df.iterrows():
+    members = map(RosterMember._make, filtered_roster_df.itertuples(index=False, name=None))
+    for index, row, missing_required, missing_position in zip(filtered_roster_df.index, members,
+                                                              row_missing, first_missing):
+        grade = row.grade
 
         # Check for officer ranks
-        if row['GRADE'] in OFFICER_RANKS:
-            error_log.append(f"Officer {row['FULL_NAME']} ({row['GRADE']}) excluded from enlisted promotion processing")
+        if grade in officer_ranks:
+            error_log.append(f"Officer {row.full_name} ({grade}) excluded from enlisted promotion processing")
             continue
 
-        if row['GRADE'] not in ENLISTED_RANKS:
-            error_log.append(f"Unknown or unsupported rank: {row['GRADE']} for {row['FULL_NAME']}")
+        if grade not in enlisted_ranks:
+            error_log.append(f"Unknown or unsupported rank: {grade} for {row.full_name}")
             continue
 
         # Check projected grades
-        if row['GRADE_PERM_PROJ'] == cycle:
+        projected_grade = row.grade_perm_proj
+        if projected_grade == cycle:
             ineligible_service_members.append(index)
             reason_for_ineligible_map[index] = f'Projected for {cycle}.'
             continue
-        elif row['GRADE_PERM_PROJ'] == PROMOTIONAL_MAP.get(cycle):
+        elif projected_grade == promotional_grade:
             continue
 
         # Early filtering - only process personnel eligible for this promotion cycle
-        if not (row['GRADE'] == cycle or (row['GRADE'] == 'A1C' and cycle == 'SRA')):
+        if not (grade == cycle or (grade == 'A1C' and cycle == 'SRA')):
             continue
 
         # Check for missing required data
-        missing_required = False
-        for column in REQUIRED_COLUMNS:
-            if column in row and pd.isna(row[column]):
-                error_log.append(f"Missing required data at row {index}, column {column}")
-                missing_required = True
-                break
-
         if missing_required:
+            error_log.append(f"Missing required data at row {index}, column {required_columns[missing_position]}")
             ineligible_service_members.append(index)
             reason_for_ineligible_map[index] = 'Missing required data'
             continue
 
-        valid_member = accounting_date_check(row['DATE_ARRIVED_STATION'], cycle, year)
+        valid_member = check_accounting_date(row.date_arrived_station, cycle, year)
         if not valid_member:
             continue
 
         # Track PASCODEs
-        if row['ASSIGNED_PAS'] not in pascodes:
-            pascodes.append(row['ASSIGNED_PAS'])
-            pascodeUnitMap[row['ASSIGNED_PAS']] = row['ASSIGNED_PAS_CLEARTEXT']
+        pascode = row.assigned_pas
+        if pascode not in pascodes:
+            pascodes.append(pascode)
+            pascodeUnitMap[pascode] = row.assigned_pas_cleartext
 
 
         # Board filter check
-        member_status = board_filter(row['GRADE'], year, row['DOR'], row['UIF_CODE'],
-                                     row['UIF_DISPOSITION_DATE'], row['TAFMSD'], row['REENL_ELIG_STATUS'],
-                                     row['PAFSC'], row['2AFSC'], row['3AFSC'], row['4AFSC'])
+        member_status = check_board(grade, year, row.dor, row.uif_code,
+                                    row.uif_disposition_date, row.tafmsd, row.reenl_elig_status,
+                                    row.pafsc, row.two_afsc, row.three_afsc, row.four_afsc)
 
         if member_status is None:
             continue
         elif member_status is True:
             eligible_service_members.append(index)
-            if row['ASSIGNED_PAS'] in unit_total_map:
-                unit_total_map[row['ASSIGNED_PAS']] += 1
+            if pascode in unit_total_map:
+                unit_total_map[pascode] += 1
             else:
-                unit_total_map[row['ASSIGNED_PAS']] = 1
+                unit_total_map[pascode] = 1
         elif member_status[0] is True and member_status[1] == 'btz':
             eligible_btz_service_members.append(index)
         elif member_status[0] is False:
@@ -128,10 +151,9 @@ def roster_processor(roster_df, session_id, cycle, year):
             reason_for_ineligible_map[index] = member_status[1]
 
     pascodes = sorted(pascodes)
-    update_session(session_id, pascodes=pascodes)
 
     # Create PDF DataFrames with parsed datetime objects
-    pdf_roster = filtered_roster_df[PDF_COLUMNS].copy()
+    pdf_roster = filtered_roster_df[list(PDF_COLUMNS)].copy()
 
     eligible_df = pdf_roster.loc[eligible_service_members].copy() if eligible_service_members else pd.DataFrame()
     ineligible_df = pdf_roster.loc[ineligible_service_members].copy() if ineligible_service_members else pd.DataFrame()
@@ -176,16 +198,19 @@ def roster_processor(roster_df, session_id, cycle, year):
     else:
         small_unit_df = pd.DataFrame()
 
-    # Update session with results
-    update_session(session_id, eligible_df=eligible_df)
-    update_session(session_id, ineligible_df=ineligible_df)
-    update_session(session_id, btz_df=btz_df)
-    update_session(session_id, small_unit_df=small_unit_df)
+    # Update session with results in one write; the updated session is handed back so callers need not re-read it
+    session_updates = {
+        'pascodes': pascodes,
+        'eligible_df': eligible_df,
+        'ineligible_df': ineligible_df,
+        'btz_df': btz_df,
+        'small_unit_df': small_unit_df,
+    }
 
     if pascodeUnitMap:
-        update_session(session_id, pascode_unit_map=pascodeUnitMap)
+        session_updates['pascode_unit_map'] = pascodeUnitMap
 
     if error_log:
-        update_session(session_id, error_log=error_log)
+        session_updates['error_log'] = error_log
 
-    return
+    return update_session(session_id, **session_updates)
@@ -1,21 +1,29 @@
 from io import BytesIO
 import os
-import json
+import logging
+import orjson
 import uuid
 import redis
 import pandas as pd
 from dotenv import load_dotenv
 import base64
-from constants import session_ttl
+import zstandard
+from constants import session_ttl, redis_max_connections, redis_pool_timeout, pdf_compression_level
 from datetime import datetime
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 
 REDIS_URL = os.getenv("REDIS_URL")
-r = redis.from_url(REDIS_URL, decode_responses=True)
+# One pool per process shared by every handler and threadpool worker; when it is exhausted callers
+# wait up to redis_pool_timeout seconds for a free connection, then get redis.ConnectionError
+redis_pool = redis.BlockingConnectionPool.from_url(
+    REDIS_URL, decode_responses=True, max_connections=redis_max_connections, timeout=redis_pool_timeout
+)
+r = redis.Redis(connection_pool=redis_pool)
 
 
-def create_session(processed_df: pd.DataFrame, pdf_df: pd.DataFrame):
+def create_session(processed_df: pd.DataFrame):
     session_id = str(uuid.uuid4())
 
     def convert_datetime_columns(df):
@@ -34,7 +42,6 @@ def create_session(processed_df: pd.DataFrame, pdf_df: pd.DataFrame):
 
     # Convert datetime columns first
     processed_clean = convert_datetime_columns(processed_df)
-    pdf_clean = convert_datetime_columns(pdf_df)
 
     def simple_sanitize(records):
         for record in records:
@@ -44,18 +51,18 @@ def create_session(processed_df: pd.DataFrame, pdf_df: pd.DataFrame):
         return records
 
     session_data = {
+        # PDF views are projected from these records with PDF_COLUMNS when needed, so no second copy is stored
         "dataframe": simple_sanitize(processed_clean.to_dict(orient="records")),
-        "pdf_dataframe": simple_sanitize(pdf_clean.to_dict(orient="records")),
     }
 
-    r.set(session_id, json.dumps(session_data), ex=session_ttl)
+    r.set(session_id, orjson.dumps(session_data), ex=session_ttl)
     return session_id
 
 def get_session(session_id):
     raw = r.get(session_id)
     if not raw:
         return None
-    return json.loads(raw)
+    return orjson.loads(raw)
 
 
 def update_session(session_id, **kwargs):
@@ -63,7 +70,7 @@ def update_session(session_id, **kwargs):
     if not session:
         return None
 
-    session = json.loads(session)
+    session = orjson.loads(session)
 
     def comprehensive_sanitize(obj):
         """Recursively sanitize any datetime objects in nested structures"""
@@ -91,7 +98,7 @@ def update_session(session_id, **kwargs):
         else:
             session[key] = comprehensive_sanitize(value)
 
-    r.set(session_id, json.dumps(session), ex=session_ttl)
+    r.set(session_id, orjson.dumps(session), ex=session_ttl)
     return session
 
 
@@ -100,13 +107,42 @@ def delete_session(session_id):
 
 
 def store_pdf_in_redis(session_id: str, pdf_buffer: BytesIO):
-    encoded = base64.b64encode(pdf_buffer.getvalue()).decode("utf-8")
+    # Repeated page furniture makes the merged PDFs compress several-fold, which shrinks Redis memory and transfer
+    compressed = zstandard.ZstdCompressor(level=pdf_compression_level).compress(pdf_buffer.getvalue())
+    encoded = base64.b64encode(compressed).decode("utf-8")
     r.set(f"{session_id}_pdf", encoded, ex=session_ttl)
 
 
-def get_pdf_from_redis(session_id: str) -> BytesIO | None:
-    encoded = r.get(f"{session_id}_pdf")
-    if not encoded:
+def open_pdf_stream(session_id: str, chunk_size: int = 65536):
+    """Fetch the stored PDF's first chunk up front and return a generator over the whole file, or None if it is missing"""
+    # Base64 decodes in independent 4-character groups, so chunk_size must stay a multiple of 4
+    key = f"{session_id}_pdf"
+    pipe = r.pipeline()
+    pipe.strlen(key)
+    pipe.getrange(key, 0, chunk_size - 1)
+    size, encoded = pipe.execute()
+    if not size:
         return None
-    pdf_bytes = base64.b64decode(encoded)
-    return BytesIO(pdf_bytes)
\ No newline at end of file
+    decompressor = zstandard.ZstdDecompressor().decompressobj()
+    first_chunk = decompressor.decompress(base64.b64decode(encoded))
+    return _stream_pdf_chunks(key, size, chunk_size, decompressor, first_chunk)
+
+
+def _stream_pdf_chunks(key, size, chunk_size, decompressor, first_chunk):
+    """Yield the prefetched chunk, then the rest of the PDF read with GETRANGE so a download never holds the whole file"""
+    if first_chunk:
+        yield first_chunk
+    start = chunk_size
+    # Headers are already sent by now, so a failure can only end the stream early; log it rather than raise
+    try:
+        while start < size:
+            encoded = r.getrange(key, start, start + chunk_size - 1)
+            if not encoded:
+                logger.error("PDF %s disappeared after %d of %d bytes were streamed", key, start, size)
+                return
+            pdf_bytes = decompressor.decompress(base64.b64decode(encoded))
+            if pdf_bytes:
+                yield pdf_bytes
+            start += chunk_size
+    except Exception:
+        logger.exception("Error streaming PDF %s", key)